@@ -9,10 +9,19 @@ EXAONE Agent (Module)
 - (Agent 3-3) 영어 -> 한국어 번역 기능을 제공합니다.
 """
 
+import os
 import re
+import time
+import unicodedata
+import queue
+import threading
+from concurrent.futures import Future
+
 import torch
 from transformers import AutoModelForCausalLM, AutoTokenizer
 
+from result_cache import ResultCache
+
 # =========================================================
 # 1. 모델 설정
 # =========================================================
@@ -38,34 +47,175 @@ def _load_exaone():
 # =========================================================
 # 3. [Agent 1 기능] 한국어 → 영어
 # =========================================================
-def korean_to_english(korean_text: str) -> str:
-    """
-    한국어 텍스트를 자연스러운 영어 문장으로 변환합니다.
-    """
-    if not korean_text.strip():
-        return ""
-    print("🧠 [Agent 1] Translating Korean → English (EXAONE)...")
-    tok, mdl = _load_exaone() # 캐시된 모델 사용
+MAX_NEW_TOKENS = 256
+MAX_BATCH_SIZE = 8       # 한 번의 generate에 묶을 최대 요청 수
+BATCH_WAIT_MS = 10       # 첫 요청 이후 다른 요청을 기다리는 시간 (ms)
 
-    messages = [
+def _translation_messages(korean_text: str) -> list[dict]:
+    return [
         {"role": "user", "content": f"Translate the following Korean text into one natural English sentence. Respond *only* with the translated sentence itself, without any explanations or conversational text.\n\nKorean: {korean_text}"}
     ]
-    inputs = tok.apply_chat_template(
-        messages, return_tensors="pt", add_generation_prompt=True
-    ).to(mdl.device)
-
-    input_length = inputs.shape[1]
-    with torch.no_grad():
-        outputs = mdl.generate(inputs, max_new_tokens=256, do_sample=False)
-    
-    new_tokens = outputs[0][input_length:]
-    result_text = tok.decode(new_tokens, skip_special_tokens=True).strip()
 
+def _postprocess(result_text: str) -> str:
     match = re.search(r'["\'](.*?_*)["\']', result_text)
     if match:
         return match.group(1).strip()
     return result_text.split('\n')[-1].strip()
 
+def _translate_batch(korean_texts: list[str]) -> list[str]:
+    """
+    여러 프롬프트를 왼쪽 패딩하여 한 번의 generate 호출로 번역합니다.
+    (왼쪽 패딩이어야 모든 행의 생성 시작 위치가 같아집니다)
+    """
+    tok, mdl = _load_exaone() # 캐시된 모델 사용
+    prompts = [
+        tok.apply_chat_template(_translation_messages(t), tokenize=False, add_generation_prompt=True)
+        for t in korean_texts
+    ]
+    tok.padding_side = "left"
+    if tok.pad_token is None:
+        tok.pad_token = tok.eos_token
+    # chat template에 이미 특수 토큰이 포함되어 있으므로 다시 붙이지 않음
+    enc = tok(prompts, return_tensors="pt", padding=True, add_special_tokens=False).to(mdl.device)
+
+    input_length = enc["input_ids"].shape[1]
+    with torch.no_grad():
+        outputs = mdl.generate(
+            **enc, max_new_tokens=MAX_NEW_TOKENS, do_sample=False, pad_token_id=tok.pad_token_id
+        )
+
+    results = []
+    for row in outputs:
+        result_text = tok.decode(row[input_length:], skip_special_tokens=True).strip()
+        results.append(_postprocess(result_text))
+    return results
+
+class _MicroBatcher:
+    """
+    동시에 들어온 번역 요청을 BATCH_WAIT_MS 동안 모아 한 번에 generate 합니다.
+    요청마다 Future를 돌려주므로 각 호출자는 자기 결과만 받습니다.
+    """
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, wait_ms: float = BATCH_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.wait_s = wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, korean_text: str) -> Future:
+        fut = Future()
+        self._ensure_worker()
+        self._queue.put((korean_text, fut))
+        return fut
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="exaone-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.wait_s
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            texts = [text for text, _ in batch]
+            try:
+                results = _translate_batch(texts)
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), result in zip(batch, results):
+                fut.set_result(result)
+
+_batcher = _MicroBatcher()
+
+# =========================================================
+# 4. 번역 결과 캐시 (do_sample=False → 같은 입력이면 같은 출력)
+# =========================================================
+TRANSLATION_CACHE_SIZE = 4096
+# SQLite 영구 캐시 경로 (None이면 메모리 LRU만 사용)
+TRANSLATION_CACHE_DB = os.path.join("agents", "cache", "translation_cache.sqlite")
+
+_translation_cache = ResultCache(
+    maxsize=TRANSLATION_CACHE_SIZE, db_path=TRANSLATION_CACHE_DB, table="translations"
+)
+
+def _normalize(korean_text: str) -> str:
+    """캐시 key용 정규화: 유니코드 NFC + 공백 정리"""
+    return " ".join(unicodedata.normalize("NFC", korean_text).split())
+
+def _cache_key(normalized_text: str) -> str:
+    return f"{MODEL_NAME}\x1f{normalized_text}"
+
+def translation_cache_stats() -> dict:
+    """번역 캐시 hit / miss / size를 반환합니다."""
+    return _translation_cache.stats()
+
+# 진행 중인 번역: 정규화된 텍스트 → Future
+# (동시에 들어온 같은 문장은 캐시에 아직 없으므로, 하나의 디코딩 결과를 함께 기다림)
+_inflight = {}
+_inflight_lock = threading.RLock()  # 이미 끝난 Future의 콜백은 등록한 스레드에서 바로 실행됨
+
+def _on_translated(text: str, fut: Future):
+    """번역이 끝나면 캐시에 먼저 저장한 뒤 진행 중 목록에서 제거합니다."""
+    if fut.exception() is None and fut.result():
+        _translation_cache.put(_cache_key(text), fut.result())
+    with _inflight_lock:
+        if _inflight.get(text) is fut:
+            del _inflight[text]
+
+def _translate_shared(text: str) -> Future:
+    """캐시 → 진행 중인 같은 번역 → 새 마이크로 배치 요청 순으로 Future를 돌려줍니다."""
+    with _inflight_lock:
+        fut = _inflight.get(text)
+        if fut is not None:
+            return fut
+        # 캐시 조회도 lock 안에서: 직전에 끝나 목록에서 빠진 번역은 이미 캐시에 있음
+        cached = _translation_cache.get(_cache_key(text))
+        if cached is not None:
+            fut = Future()
+            fut.set_result(cached)
+            return fut
+        fut = _batcher.submit(text)
+        _inflight[text] = fut
+        fut.add_done_callback(lambda f, t=text: _on_translated(t, f))
+        return fut
+
+def korean_to_english_batch(korean_texts: list[str]) -> list[str]:
+    """
+    여러 한국어 텍스트를 번역합니다. (입력 순서대로 결과 반환)
+    캐시에 없는 입력만 다른 호출자의 요청과 함께 마이크로 배치로 묶여 실행되며,
+    다른 호출자가 이미 번역 중인 같은 문장은 그 결과를 함께 사용합니다.
+    """
+    normalized = [_normalize(t) for t in korean_texts]
+    futures = {}
+    for text in normalized:
+        if text and text not in futures:
+            futures[text] = _translate_shared(text)
+
+    results = {text: fut.result() for text, fut in futures.items()}
+
+    return [results.get(text, "") for text in normalized]
+
+def korean_to_english(korean_text: str) -> str:
+    """
+    한국어 텍스트를 자연스러운 영어 문장으로 변환합니다.
+    """
+    if not korean_text.strip():
+        return ""
+    print("🧠 [Agent 1] Translating Korean → English (EXAONE)...")
+    return korean_to_english_batch([korean_text])[0]
+
 # =========================================================
 # 5. 테스트 실행 (Agent 1의 원본 테스트 코드)
 # =========================================================
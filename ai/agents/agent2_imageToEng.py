@@ -81,17 +81,85 @@ Agent 2 (Module)
 - Ollama (Gemma3)를 이용한 이미지 캡션 생성을 전담합니다.
 """
 
+import io
 import os
+import json
 import base64
+import socket
+import hashlib
+import tempfile
+import ipaddress
 import requests
-import re  # 👈 후처리를 위한 re 임포트
+from urllib.parse import urlparse, urljoin
+from concurrent.futures import ThreadPoolExecutor
+from ollama_api import generate, extract_sentence, get_session  # 👈 공유 Ollama 클라이언트 (후처리 포함)
+from result_cache import ResultCache
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow가 없으면 원본 바이트를 그대로 전송
+    Image = None
 
 # =========================================================
 # 1. 설정
 # =========================================================
-OLLAMA_URL = "http://localhost:11434"
 MODEL_NAME = "gemma3:27b" # (Agent 3와 동일한 모델 사용)
 
+# 캡션 캐시: 이미지 바이트의 SHA-256 → 캡션 (같은 이미지를 다시 보내면 모델 호출 생략)
+CAPTION_CACHE_SIZE = 512
+CAPTION_CACHE_DB = os.path.join("agents", "cache", "caption_cache.sqlite") # None이면 메모리만 사용
+
+_caption_cache = ResultCache(maxsize=CAPTION_CACHE_SIZE, db_path=CAPTION_CACHE_DB, table="captions")
+
+def caption_cache_stats() -> dict:
+    """캡션 캐시 hit / miss / size를 반환합니다."""
+    return _caption_cache.stats()
+
+# 전처리: 긴 변을 MAX_IMAGE_SIDE로 제한 후 재인코딩 (비전 모델이 어차피 내부에서 축소함)
+MAX_IMAGE_SIDE = 1024
+IMAGE_FORMAT = "JPEG"   # "JPEG" 또는 "WEBP"
+IMAGE_QUALITY = 85
+_CHUNK_SIZE = 1 << 20 # 파일 해시 계산 시 한 번에 읽을 크기
+
+def _sha256_file(image_path: str) -> str:
+    """이미지 파일을 조각 단위로 읽어 SHA-256을 계산합니다."""
+    h = hashlib.sha256()
+    with open(image_path, "rb") as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _prepare_image(image_path: str):
+    """
+    이미지를 축소/재인코딩한 바이너리 스트림을 반환합니다.
+    Pillow가 없거나 디코딩에 실패하면 원본 파일 스트림을 반환합니다.
+    """
+    if Image is not None:
+        try:
+            with Image.open(image_path) as img:
+                img = ImageOps.exif_transpose(img)
+                img.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+                if img.mode not in ("RGB", "L"):
+                    img = img.convert("RGB")
+                buf = io.BytesIO()
+                img.save(buf, format=IMAGE_FORMAT, quality=IMAGE_QUALITY)
+            buf.seek(0)
+            return buf
+        except Exception as e:
+            print(f"⚠️ Image preprocessing failed, sending original: {e}")
+    return open(image_path, "rb")
+
+def _b64encode(stream) -> str:
+    """
+    전처리된 이미지 스트림을 base64 문자열로 인코딩합니다.
+    (BytesIO는 내부 버퍼를 복사 없이 그대로 인코딩. 요청 JSON에는 전체 문자열이 들어갑니다)
+    """
+    with stream:
+        if isinstance(stream, io.BytesIO):
+            with stream.getbuffer() as view:
+                return base64.b64encode(view).decode("ascii")
+        return base64.b64encode(stream.read()).decode("ascii")
+
 # =========================================================
 # 2. 이미지 캡션 생성 함수 (메인 파이프라인에서 이 함수를 import)
 # =========================================================
@@ -101,15 +169,21 @@ def image_to_english_caption(image_path: str) -> str:
     """
     if not image_path or not os.path.exists(image_path):
         return ""
-    
+
+    return _caption_image(image_path, _sha256_file(image_path))
+
+def _caption_image(image_path: str, digest: str) -> str:
+    """내용 해시(digest)가 계산된 이미지의 캡션 생성 (캐시 → 모델 호출)"""
     print("🖼️  [Agent 2] Describing image → English caption (Ollama)...")
 
-    if not os.path.exists(image_path):
-        print(f"❌ Image not found: {image_path}")
-        return ""
+    # 내용 기반 캐시 조회 (hit이면 전처리, base64 인코딩, 모델 호출을 모두 건너뜀)
+    cache_key = f"{MODEL_NAME}:{digest}"
+    cached = _caption_cache.get(cache_key)
+    if cached is not None:
+        print("   -> (cache hit)")
+        return cached
 
-    with open(image_path, "rb") as f:
-        image_b64 = base64.b64encode(f.read()).decode("utf-8")
+    image_b64 = _b64encode(_prepare_image(image_path))
 
     prompt = (
         "Describe this image in ONE natural English sentence. "
@@ -117,16 +191,8 @@ def image_to_english_caption(image_path: str) -> str:
         "Do not list elements; write a single complete sentence."
     )
 
-    payload = {
-        "model": MODEL_NAME,
-        "prompt": prompt,
-        "images": [image_b64],
-        "stream": False
-    }
-
     try:
-        res = requests.post(f"{OLLAMA_URL}/api/generate", json=payload, timeout=120)
-        res.raise_for_status()
+        raw_response = generate(MODEL_NAME, prompt, images=[image_b64], timeout=120)
     except requests.exceptions.ConnectionError:
         print("🚨 Ollama 서버가 꺼져 있습니다. 터미널에서 `ollama serve` 를 실행하세요.")
         return ""
@@ -134,15 +200,194 @@ def image_to_english_caption(image_path: str) -> str:
         print(f"🔥 Ollama 요청 실패: {e}")
         return ""
 
-    # [수정] 👈 Agent 3와 동일한 후처리 로직 적용
-    raw_response = (res.json().get("response") or "").strip()
-    match = re.search(r'["\'](.*?_*)["\']', raw_response) # 따옴표 안 내용 추출
-    if match:
-        return match.group(1).strip()
-    return raw_response.split('\n')[-1].strip() # 따옴표 없으면 마지막 줄 반환
+    # [수정] 👈 Agent 3와 동일한 후처리 로직 적용 (따옴표 안 내용 또는 마지막 줄)
+    caption = extract_sentence(raw_response)
+    if caption:
+        _caption_cache.put(cache_key, caption)
+    return caption
+
+# =========================================================
+# 3. 여러 이미지 캡션 생성 (배치)
+# =========================================================
+MAX_CAPTION_CONCURRENCY = 4  # Ollama로 동시에 보낼 최대 요청 수
+
+def images_to_english_captions(image_paths: list[str], max_concurrency: int = MAX_CAPTION_CONCURRENCY,
+                               single_request: bool = False) -> list[str]:
+    """
+    여러 이미지의 캡션을 입력 순서대로 반환합니다.
+
+    Args:
+        image_paths (list[str]): 로컬 이미지 경로 리스트
+        max_concurrency (int): 동시에 보낼 최대 Ollama 요청 수
+        single_request (bool): True이면 캐시에 없는 이미지를 한 번의 멀티모달 요청으로 보냄
+                               (실패 시 이미지별 요청으로 대체)
+    Returns:
+        list[str]: 이미지별 영어 캡션 (실패/없는 이미지는 "")
+    """
+    if not image_paths:
+        return []
+
+    # 같은 내용의 이미지는 한 번만 캡션 생성 (동시에 캐시 miss가 나 중복 호출되는 것 방지)
+    positions = {}  # 내용 해시 → 입력 위치 목록
+    unique = {}     # 내용 해시 → 대표 경로
+    for i, image_path in enumerate(image_paths):
+        if not image_path:
+            continue
+        if not os.path.exists(image_path):
+            print(f"❌ Image not found: {image_path}")
+            continue
+        digest = _sha256_file(image_path)
+        positions.setdefault(digest, []).append(i)
+        unique.setdefault(digest, image_path)
+
+    captions = [""] * len(image_paths)
+    if not unique:
+        return captions
+
+    results = None
+    if single_request:
+        results = _captions_in_one_request(unique)
+    if results is None:
+        workers = max(1, min(max_concurrency, len(unique)))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="agent2") as pool:
+            results = dict(zip(unique, pool.map(_caption_image, unique.values(), unique)))
+
+    for digest, caption in results.items():
+        for i in positions[digest]:
+            captions[i] = caption
+    return captions
+
+def _captions_in_one_request(unique: dict[str, str]) -> dict[str, str] | None:
+    """
+    캐시에 없는 이미지들을 하나의 요청(images=[...])으로 보내 JSON 배열로 캡션을 받습니다.
+    unique: 내용 해시 → 경로 (중복 제거됨). 반환: 내용 해시 → 캡션
+    응답 개수가 맞지 않는 등 실패하면 None을 반환합니다.
+    """
+    captions = {}
+    pending = []  # (digest, cache_key)
+    for digest in unique:
+        cache_key = f"{MODEL_NAME}:{digest}"
+        cached = _caption_cache.get(cache_key)
+        if cached is not None:
+            captions[digest] = cached
+        else:
+            pending.append((digest, cache_key))
+    if not pending:
+        return captions
+
+    print(f"🖼️  [Agent 2] Describing {len(pending)} images in one request (Ollama)...")
+    images_b64 = [_b64encode(_prepare_image(unique[digest])) for digest, _ in pending]
+    prompt = (
+        f"You are given {len(pending)} images. "
+        "For EACH image, in the given order, describe it in ONE natural English sentence. "
+        "Focus on the atmosphere, mood, and main objects. "
+        'Respond *only* with a valid JSON object in this format: {"captions": ["sentence1", "sentence2"]}'
+    )
+    try:
+        raw_response = generate(MODEL_NAME, prompt, images=images_b64, format="json", timeout=120)
+        batch_captions = json.loads(raw_response).get("captions") or []
+    except Exception as e:
+        print(f"⚠️ Multi-image request failed, falling back to per-image: {e}")
+        return None
+    if len(batch_captions) != len(pending) or not all(isinstance(c, str) for c in batch_captions):
+        print(f"⚠️ Expected {len(pending)} captions, got {len(batch_captions)}. Falling back to per-image.")
+        return None
+
+    for (digest, cache_key), caption in zip(pending, batch_captions):
+        captions[digest] = caption.strip()
+        if captions[digest]:
+            _caption_cache.put(cache_key, captions[digest])
+    return captions
+
+# server.py는 이미지 URL(imageUrls)을 넘기므로 http(s) URL은 임시 파일로 내려받아 처리
+# 서버는 외부에 열려 있으므로 내부 주소(Ollama 등)로의 요청(SSRF)을 막습니다.
+IMAGE_DOWNLOAD_TIMEOUT = 30          # 초
+MAX_IMAGE_BYTES = 20 * 1024 * 1024   # 이보다 큰 이미지는 거부
+MAX_IMAGE_REDIRECTS = 3              # 리디렉션은 직접 따라가며 매번 주소를 다시 검사
+# 비어 있지 않으면 이 호스트들에서만 내려받음 (예: "cdn.example.com,images.example.com")
+IMAGE_URL_ALLOWED_HOSTS = {h.strip().lower() for h in
+                           os.environ.get("IMAGE_URL_ALLOWED_HOSTS", "").split(",") if h.strip()}
+
+def _check_image_url(url: str):
+    """
+    내려받아도 되는 URL인지 검사합니다. (아니면 ValueError)
+    - http(s)만, 허용 호스트 목록이 있으면 그 안의 호스트만
+    - 호스트가 가리키는 모든 주소가 공인(global) 주소여야 함 (loopback/사설/link-local 등 거부)
+    """
+    parsed = urlparse(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("only http(s) URLs are allowed")
+    host = parsed.hostname.lower()
+    if IMAGE_URL_ALLOWED_HOSTS and host not in IMAGE_URL_ALLOWED_HOSTS:
+        raise ValueError(f"host not allowed: {host}")
+    try:
+        infos = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80),
+                                   type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise ValueError(f"cannot resolve {host}: {e}")
+    for info in infos:
+        addr = ipaddress.ip_address(info[4][0].split("%")[0])
+        addr = getattr(addr, "ipv4_mapped", None) or addr  # ::ffff:127.0.0.1 → 127.0.0.1
+        if not addr.is_global or addr.is_multicast:
+            raise ValueError(f"non-public address refused: {host} → {addr}")
+
+def _download_image(url: str) -> str | None:
+    """이미지 URL을 임시 파일로 내려받아 경로를 반환합니다. 실패/거부되면 None (호출부에서 삭제)."""
+    path = None
+    try:
+        for _ in range(MAX_IMAGE_REDIRECTS + 1):
+            _check_image_url(url)
+            res = get_session().get(url, stream=True, timeout=IMAGE_DOWNLOAD_TIMEOUT, allow_redirects=False)
+            if not res.is_redirect:
+                break
+            res.close()
+            url = urljoin(url, res.headers["Location"])
+        else:
+            raise ValueError("too many redirects")
+
+        with res:
+            res.raise_for_status()
+            content_type = res.headers.get("Content-Type", "").split(";")[0].strip().lower()
+            if not content_type.startswith("image/"):
+                raise ValueError(f"not an image (Content-Type: {content_type or 'missing'})")
+            fd, path = tempfile.mkstemp(prefix="agent2_", suffix=os.path.splitext(urlparse(url).path)[1])
+            size = 0
+            with os.fdopen(fd, "wb") as f:
+                for chunk in res.iter_content(_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_IMAGE_BYTES:
+                        raise ValueError(f"image larger than {MAX_IMAGE_BYTES} bytes")
+                    f.write(chunk)
+        return path
+    except Exception as e:
+        print(f"⚠️ Image download failed ({url}): {e}")
+        if path and os.path.exists(path):
+            os.remove(path)
+        return None
+
+def extract_image_features(image_refs: list[str]) -> str:
+    """
+    (server.py용) 여러 이미지 캡션을 하나의 묘사 문자열로 합칩니다.
+    image_refs는 로컬 경로 또는 http(s) URL입니다. (URL은 내려받은 뒤 캡션 생성, 끝나면 삭제)
+    """
+    downloaded = []
+    paths = []
+    for ref in image_refs or []:
+        if str(ref).startswith(("http://", "https://")):
+            path = _download_image(ref)
+            if path:
+                downloaded.append(path)
+            paths.append(path or "")
+        else:
+            paths.append(ref)
+    try:
+        return " ".join(c for c in images_to_english_captions(paths) if c)
+    finally:
+        for path in downloaded:
+            os.remove(path)
 
 # =========================================================
-# 3. 테스트 실행 (독립 실행용)
+# 4. 테스트 실행 (독립 실행용)
 # =========================================================
 if __name__ == "__main__":
     print("\n🖼️  Agent 2 (Module) 테스트")
@@ -14,7 +14,10 @@ import re
 import json
 import base64
 from datetime import datetime
-import requests
+from concurrent.futures import ThreadPoolExecutor
+
+# 공유 Ollama 클라이언트 (keep-alive 세션)
+from ollama_api import chat, extract_sentence
 
 # agent1 import
 try:
@@ -47,7 +50,6 @@ except ImportError:
 # =========================================================
 # 1. 전역 설정
 # =========================================================
-OLLAMA_URL = "http://localhost:11434"
 GEMMA3_MODEL = "gemma3:27b" # (Ollama가 멀티모달을 지원하는 모델 ID)
 SAVE_DIR = "agents/keywords"
 os.makedirs(SAVE_DIR, exist_ok=True)
@@ -90,16 +92,9 @@ Respond *only* with the final combined English sentence.
 """
     
     messages = [{"role": "user", "content": prompt.strip()}]
-    payload = {"model": GEMMA3_MODEL, "messages": messages, "stream": False, "format": "text"}
     try:
-        res = requests.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=60)
-        res.raise_for_status()
-        
-        raw_response = (res.json().get("message", {}).get("content", "") or "").strip()
-        match = re.search(r'["\'](.*?_*)["\']', raw_response)
-        if match:
-            return match.group(1).strip()
-        return raw_response.split('\n')[-1].strip()
+        raw_response = chat(GEMMA3_MODEL, messages, format="text", timeout=60)
+        return extract_sentence(raw_response)
         
     except Exception as e:
         print(f"⚠️ Merge failed: {e}")
@@ -129,17 +124,9 @@ Respond *only* with a valid JSON object in this format:
         {"role": "system", "content": system_prompt},
         {"role": "user", "content": prompt_content}
     ]
-    payload = {"model": GEMMA3_MODEL, "messages": messages, "stream": False, "format": "json"}
     try:
-        res = requests.post(f"{OLLAMA_URL}/api/chat", json=payload, timeout=60)
-        res.raise_for_status()
-
-        # ✅ Ollama 응답 구조 대응
-        raw_output = (
-            res.json().get("message", {}).get("content")
-            or res.json().get("response")
-            or ""
-        ).strip()
+        # ✅ Ollama 응답 구조 대응 (message.content / response 모두 ollama_api에서 처리)
+        raw_output = chat(GEMMA3_MODEL, messages, format="json", timeout=60)
 
         try:
             parsed_data = json.loads(raw_output)
@@ -149,14 +136,76 @@ Respond *only* with a valid JSON object in this format:
             raw = re.sub(r"[^a-zA-Z,\n ]", "", raw_output)
             keywords = [w.strip().lower() for w in re.split(r"[, \n]+", raw) if w.strip()]
 
-        # ✅ 필터링 및 상한 제한
-        keywords = [w for w in keywords if 2 <= len(w) <= 15][:k]
+        keywords = _filter_keywords(keywords, k)
         print(f"🪶 Extracted keywords → {keywords}")
         return keywords
 
     except Exception as e:
         print(f"🔥 Keyword extraction failed: {e}")
         return []
+
+def _filter_keywords(keywords: list, k: int) -> list[str]:
+    """✅ 필터링 및 상한 제한"""
+    return [w for w in keywords if isinstance(w, str) and 2 <= len(w) <= 15][:k]
+
+# =========================================================
+# 7. [Agent 3-1 + 3-2] 문장 재작성 + 키워드 추출 통합 호출 (JSON 모드)
+# =========================================================
+# True이면 재작성/키워드 추출을 한 번의 /api/chat 호출로 처리합니다. (기본: 기존 2단계 호출)
+# 통합 호출이 실패하면 기존 2단계 호출(5, 6번)로 자동 대체합니다.
+FUSED_AGENT3 = os.environ.get("AGENT3_FUSED", "0") == "1"
+
+def rewrite_and_extract_keywords(text1: str, text2: str, full_history: str, k: int = 3) -> tuple[str, list[str]]:
+    """
+    (Agent 3, 통합 모드)
+    '전체 대화 이력'과 '새 입력'을 한 번의 JSON 요청으로
+    재작성 문장(merged_sentence)과 키워드(keywords)로 변환합니다.
+
+    Returns:
+        (merged_sentence, keywords) — 새 입력이 없으면 ("", [])
+    """
+    new_input_sentence = f"{text1} {text2}".strip()
+    if not new_input_sentence:
+        print("⚠️ [Agent 3] No new input text or image provided.")
+        return "", []
+
+    print("🧩 [Agent 3] Merging sentences + extracting keywords in one call (Ollama w/ JSON)...")
+
+    system_prompt = """
+You are a context-aware music assistant and an expert keyword extractor.
+Respond *only* with a valid JSON object in this format:
+{"merged_sentence": "one English sentence", "keywords": ["keyword1", "keyword2", "keyword3"]}
+"""
+    prompt_content = f"""
+[Past Conversation History]
+{full_history}
+
+[User's Newest Input]
+"{new_input_sentence}"
+
+1. Combine *all* this context (History + New Input) into ONE single, updated descriptive sentence that reflects the user's *final* intent.
+   For example, if History is "Rainy day" and New Input is "make it calmer", the sentence should be "A calm and rainy day".
+2. **Analyze the user's intent** in that sentence and **generate {k} keywords** that describe the mood, atmosphere, or genre they are looking for.
+"""
+    messages = [
+        {"role": "system", "content": system_prompt.strip()},
+        {"role": "user", "content": prompt_content.strip()}
+    ]
+    try:
+        raw_output = chat(GEMMA3_MODEL, messages, format="json", timeout=60)
+        parsed_data = json.loads(raw_output)
+        merged = (parsed_data.get("merged_sentence") or "").strip()
+        keywords = _filter_keywords(parsed_data.get("keywords") or [], k)
+        if not merged or not keywords:
+            raise ValueError(f"incomplete JSON: {raw_output}")
+    except Exception as e:
+        # 통합 호출 실패 시 기존 2단계 경로로 대체
+        print(f"⚠️ Fused call failed, falling back to 2-step: {e}")
+        merged = rewrite_combined_sentence(text1, text2, full_history)
+        return merged, extract_keywords(merged, k=k)
+
+    print(f"🪶 Extracted keywords → {keywords}")
+    return merged, keywords
     
 # =========================================================
 # 8. 세션 저장
@@ -215,14 +264,22 @@ def run_agent_pipeline(korean_text="", image_path="") -> dict:
     session_file_path = os.path.join(SAVE_DIR, "active_session.json")
     full_history = get_full_conversation_history(session_file_path)
     
-    # [Agent 1]
-    english_text = korean_to_english(korean_text) if korean_text else ""
-    # [Agent 2]
-    english_caption = image_to_english_caption(image_path) if image_path else ""
-    # [Agent 3-1]
-    merged = rewrite_combined_sentence(english_text, english_caption, full_history)
-    # [Agent 3-2]: 영어 키워드 추출
-    eng_keywords = extract_keywords(merged, k=3)
+    # [Agent 1] + [Agent 2]: 서로 독립적이므로 동시에 실행 (지연 ≈ max(A1, A2))
+    #   - Agent 1: 로컬 EXAONE (torch, GIL 해제 구간이 대부분)
+    #   - Agent 2: 원격 Ollama HTTP 요청 (I/O 대기)
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="agent") as pool:
+        a1 = pool.submit(korean_to_english, korean_text) if korean_text else None
+        a2 = pool.submit(image_to_english_caption, image_path) if image_path else None
+        english_text = a1.result() if a1 else ""
+        english_caption = a2.result() if a2 else ""
+    if FUSED_AGENT3:
+        # [Agent 3-1 + 3-2]: 한 번의 호출로 재작성 + 키워드 추출
+        merged, eng_keywords = rewrite_and_extract_keywords(english_text, english_caption, full_history, k=3)
+    else:
+        # [Agent 3-1]
+        merged = rewrite_combined_sentence(english_text, english_caption, full_history)
+        # [Agent 3-2]: 영어 키워드 추출
+        eng_keywords = extract_keywords(merged, k=3)
     
     # RAG 검색 (노래 추천) ---
     recommended_songs = get_song_recommendations(eng_keywords, top_k=5)
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+ollama_api.py
+- 모든 Ollama 호출(/api/generate, /api/chat)이 공유하는 클라이언트 모듈입니다.
+- keep-alive 커넥션 풀을 가진 requests.Session 하나를 프로세스 전체에서 재사용합니다.
+- asyncio 버전(agenerate / achat)도 제공합니다. (aiohttp가 없으면 스레드로 대체)
+- 응답 파싱(문장 추출) 로직을 한 곳에 모읍니다.
+"""
+
+import os
+import re
+import json
+import asyncio
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp는 선택 의존성
+    aiohttp = None
+
+# =========================================================
+# 1. 설정
+# =========================================================
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+DEFAULT_TIMEOUT = 60     # 초 (텍스트 요청)
+POOL_SIZE = 16           # 호스트당 유지할 keep-alive 커넥션 수
+CONNECT_RETRIES = 2      # 연결 단계 실패 시 재시도 횟수
+
+# =========================================================
+# 2. 공유 세션 (동기)
+# =========================================================
+_session = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    keep-alive 커넥션 풀이 설정된 requests.Session을 한 번만 만들어 재사용합니다.
+    (요청마다 새 TCP 연결을 맺지 않도록)
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                retry = Retry(total=CONNECT_RETRIES, connect=CONNECT_RETRIES, read=0,
+                              status=0, backoff_factor=0.2, allowed_methods=None)
+                adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE,
+                                      max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def _post(path: str, payload: dict, timeout: float) -> dict:
+    res = get_session().post(f"{OLLAMA_URL}{path}", json=payload, timeout=timeout)
+    res.raise_for_status()
+    return res.json()
+
+def _content_of(data: dict) -> str:
+    """/api/chat, /api/generate 응답 어느 쪽이든 본문 텍스트를 꺼냅니다."""
+    return (
+        (data.get("message") or {}).get("content")
+        or data.get("response")
+        or ""
+    ).strip()
+
+def generate(model: str, prompt: str, images: list[str] | None = None,
+             timeout: float = DEFAULT_TIMEOUT, **extra) -> str:
+    """
+    /api/generate (stream=False) 호출 후 응답 텍스트를 반환합니다.
+    연결/HTTP 오류는 requests 예외 그대로 올려 보냅니다. (호출부에서 처리)
+    """
+    payload = {"model": model, "prompt": prompt, "stream": False, **extra}
+    if images:
+        payload["images"] = images
+    return _content_of(_post("/api/generate", payload, timeout))
+
+def chat(model: str, messages: list[dict], format: str | None = None,
+         timeout: float = DEFAULT_TIMEOUT, **extra) -> str:
+    """/api/chat (stream=False) 호출 후 메시지 본문을 반환합니다."""
+    payload = {"model": model, "messages": messages, "stream": False, **extra}
+    if format:
+        payload["format"] = format
+    return _content_of(_post("/api/chat", payload, timeout))
+
+def generate_stream(model: str, prompt: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+    """
+    /api/generate 스트리밍 응답(JSON lines)을 모두 이어 붙여 반환합니다.
+    """
+    payload = {"model": model, "prompt": prompt}
+    with get_session().post(f"{OLLAMA_URL}/api/generate", json=payload,
+                            stream=True, timeout=timeout) as res:
+        res.raise_for_status()
+        output = ""
+        for line in res.iter_lines():
+            if not line:
+                continue
+            try:
+                output += json.loads(line).get("response", "")
+            except json.JSONDecodeError:
+                pass
+    return output.strip()
+
+# =========================================================
+# 3. 공유 세션 (asyncio)
+# =========================================================
+# aiohttp.ClientSession은 이벤트 루프에 묶여 있으므로 루프마다 하나씩 둡니다.
+_async_sessions = {}
+
+def _get_async_session():
+    loop = asyncio.get_running_loop()
+    session = _async_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit_per_host=POOL_SIZE, keepalive_timeout=60)
+        session = aiohttp.ClientSession(connector=connector)
+        _async_sessions[loop] = session
+    return session
+
+async def _apost(path: str, payload: dict, timeout: float) -> dict:
+    session = _get_async_session()
+    async with session.post(f"{OLLAMA_URL}{path}", json=payload,
+                            timeout=aiohttp.ClientTimeout(total=timeout)) as res:
+        res.raise_for_status()
+        return await res.json(content_type=None)
+
+async def agenerate(model: str, prompt: str, images: list[str] | None = None,
+                    timeout: float = DEFAULT_TIMEOUT, **extra) -> str:
+    """generate()의 asyncio 버전입니다."""
+    if aiohttp is None:
+        return await asyncio.to_thread(generate, model, prompt, images, timeout, **extra)
+    payload = {"model": model, "prompt": prompt, "stream": False, **extra}
+    if images:
+        payload["images"] = images
+    return _content_of(await _apost("/api/generate", payload, timeout))
+
+async def achat(model: str, messages: list[dict], format: str | None = None,
+                timeout: float = DEFAULT_TIMEOUT, **extra) -> str:
+    """chat()의 asyncio 버전입니다."""
+    if aiohttp is None:
+        return await asyncio.to_thread(chat, model, messages, format, timeout, **extra)
+    payload = {"model": model, "messages": messages, "stream": False, **extra}
+    if format:
+        payload["format"] = format
+    return _content_of(await _apost("/api/chat", payload, timeout))
+
+async def aclose():
+    """현재 이벤트 루프에 묶인 aiohttp 세션을 닫습니다."""
+    session = _async_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+# =========================================================
+# 4. 응답 후처리
+# =========================================================
+def extract_sentence(raw_response: str) -> str:
+    """
+    모델 응답에서 한 문장을 뽑아냅니다.
+    따옴표 안 내용이 있으면 그것을, 없으면 마지막 줄을 반환합니다.
+    """
+    match = re.search(r'["\'](.*?_*)["\']', raw_response)
+    if match:
+        return match.group(1).strip()
+    return raw_response.split('\n')[-1].strip()
@@ -3,13 +3,24 @@
 rag_retriever.py
 - build_chroma_db.py로 구축된 ChromaDB를 로드합니다.
 - LangChain을 사용하여 RAG 검색(Similarity Search) 기능을 제공합니다.
+- (선택) RETRIEVER_BACKEND = "numpy": Chroma 대신 NumPy 인덱스(rag/numpy_index)로
+  행렬-벡터 곱 한 번에 top-k를 찾습니다. (vector_index.py)
+- (선택) QUERY_MODE = "hybrid": 태그 텍스트 BM25 검색과 벡터 검색을 병렬로 수행하고
+  reciprocal-rank fusion으로 결합합니다.
 """
 
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import numpy as np
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 import json
 
+from vector_index import (SongIndex, TagIndex, BM25Index, top_k_indices, mmr_select, dedup_select,
+                          keyword_terms, rrf_fuse)
+
 # =========================================================
 # 1. 설정 (DB 구축 스크립트와 동일해야 함)
 # =========================================================
@@ -22,27 +33,67 @@ DB_PERSIST_DIR = os.path.join(PROJECT_ROOT, "rag/chroma_db")
 COLLECTION_NAME = "jamendo_songs"
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
 
+# 👈 .../ai/spotify/chroma_db (build_chromadb_spotify.py로 구축, 통합 검색에서 사용)
+SPOTIFY_DB_PERSIST_DIR = os.path.join(PROJECT_ROOT, "spotify/chroma_db")
+SPOTIFY_COLLECTION_NAME = "spotify_songs"
+
+# 👈 .../ai/rag/numpy_index (build_chromadb_jamendo.py가 함께 내보냄)
+NUMPY_INDEX_DIR = os.path.join(PROJECT_ROOT, "rag/numpy_index")
+
+# 검색 백엔드: "chroma" (LangChain Chroma) 또는 "numpy" (in-process 행렬 검색)
+RETRIEVER_BACKEND = os.environ.get("RAG_BACKEND", "chroma")
+
+# NumPy 백엔드의 곡 벡터 저장 형식: "float32", "float16", "int8"
+# (압축 형식은 대략 top-RESCORE_POOL 후보를 고른 뒤 float32 원본으로 다시 점수 계산)
+VECTOR_STORAGE = os.environ.get("RAG_VECTOR_STORAGE", "float32")
+RESCORE_POOL = 200
+
+# 쿼리 모드: "joined" (키워드를 한 문장으로 합쳐 임베딩),
+#           "multi"  (키워드별 임베딩 → 곡 행렬과 한 번에 곱해 점수 결합, NumPy 인덱스 사용) 또는
+#           "hybrid" (태그 BM25 + 벡터 검색을 RRF로 결합, NumPy 인덱스 사용)
+QUERY_MODE = "joined"
+KEYWORD_FUSION = "sum"  # "multi" 모드의 점수 결합 방식: "sum" (가중합) 또는 "max"
+
+# 하이브리드 검색: 각 검색기에서 가져올 후보 수와 RRF 상수
+HYBRID_POOL = 100
+RRF_K = 60
+
+# 다양성 재순위화: None (사용 안 함), "mmr" (Maximal Marginal Relevance), "dedup" (같은 태그 조합 제거)
+RERANK_MODE = None
+RERANK_POOL = 100   # 재순위화 전에 가져올 후보 수
+MMR_LAMBDA = 0.7    # 1에 가까울수록 관련도, 0에 가까울수록 다양성 우선
+
 # =========================================================
 # 2. 전역 변수 (DB 및 모델 캐시)
 # =========================================================
 _vector_db = None
 _embedding_function = None
+_song_index = None
+_tag_index = None
+_bm25_index = None
+
+def _load_embedding_function():
+    """임베딩 모델을 한 번만 로드하여 캐시합니다."""
+    global _embedding_function
+    if _embedding_function is None:
+        print(f"🚀 [RAG] Loading Embedding Model ({EMBED_MODEL_NAME})...")
+        _embedding_function = HuggingFaceEmbeddings(
+            model_name=EMBED_MODEL_NAME,
+            encode_kwargs={'normalize_embeddings': True}
+        )
+    return _embedding_function
 
 def _load_retriever_resources():
     """
     ChromaDB와 임베딩 모델을 로드하여 캐시합니다.
     (프로그램 실행 시 한 번만 호출되도록)
     """
-    global _vector_db, _embedding_function
+    global _vector_db
     
     if _vector_db is not None and _embedding_function is not None:
         return _vector_db, _embedding_function
 
-    print(f"🚀 [RAG] Loading Embedding Model ({EMBED_MODEL_NAME})...")
-    _embedding_function = HuggingFaceEmbeddings(
-        model_name=EMBED_MODEL_NAME,
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    _load_embedding_function()
     
     print(f"🚀 [RAG] Loading ChromaDB from: {DB_PERSIST_DIR}")
     if not os.path.exists(DB_PERSIST_DIR):
@@ -59,38 +110,301 @@ def _load_retriever_resources():
     print(f"✅ [RAG] Retriever ready. DB Collection '{COLLECTION_NAME}' loaded.")
     return _vector_db, _embedding_function
 
+def _load_song_index() -> SongIndex:
+    """
+    NumPy 인덱스(embeddings.npy는 memory-map)를 로드하여 캐시합니다.
+    """
+    global _song_index
+    if _song_index is not None:
+        return _song_index
+
+    print(f"🚀 [RAG] Loading NumPy index from: {NUMPY_INDEX_DIR}")
+    if not os.path.exists(NUMPY_INDEX_DIR):
+        print(f"❌ [RAG] Index directory not found: {NUMPY_INDEX_DIR}")
+        print("   -> Please run 'build_chromadb_jamendo.py' first.")
+        raise FileNotFoundError(NUMPY_INDEX_DIR)
+
+    _song_index = SongIndex.load(NUMPY_INDEX_DIR, storage=VECTOR_STORAGE, rescore_pool=RESCORE_POOL)
+    print(f"✅ [RAG] NumPy index ready. {len(_song_index)} songs loaded ({VECTOR_STORAGE}).")
+    return _song_index
+
+def _load_tag_index() -> TagIndex:
+    """태그 역색인(tag_index.npz)을 로드하여 캐시합니다."""
+    global _tag_index
+    if _tag_index is None:
+        _tag_index = TagIndex.load(NUMPY_INDEX_DIR)
+    return _tag_index
+
+def _load_bm25_index() -> BM25Index:
+    """태그 역색인(ETL 태그 사전, 임베딩 행 순서)으로 BM25 역색인을 만들어 캐시합니다."""
+    global _bm25_index
+    if _bm25_index is None:
+        _bm25_index = BM25Index.from_tag_index(_load_tag_index())
+        print(f"✅ [RAG] BM25 tag index ready. {len(_bm25_index.postings)} terms.")
+    return _bm25_index
+
+def _candidate_rows(must_have_genres: list[str] | None, exclude_moods: list[str] | None) -> np.ndarray | None:
+    """
+    태그 필터를 만족하는 곡의 행 번호 배열. 필터가 없으면 None (= 전체).
+    벡터 점수 계산 전에 후보를 줄여, 필터가 있는 쿼리가 오히려 더 빨라집니다.
+    """
+    if not must_have_genres and not exclude_moods:
+        return None
+    return np.flatnonzero(_load_tag_index().mask(must_have_genres, exclude_moods))
+
+# =========================================================
+# 2-1. 쿼리/키워드 임베딩 캐시
+# =========================================================
+# 키워드 어휘는 작고 반복적이므로("calm", "cozy", "rainy"...) 같은 쿼리는
+# 트랜스포머 forward 없이 캐시된 벡터를 재사용합니다.
+EMBED_CACHE_SIZE = 2048
+
+def _normalize_keywords(english_keywords: list[str]) -> tuple[str, ...]:
+    """순서/대소문자/중복에 무관한 캐시 key (정렬된 키워드 튜플)"""
+    return tuple(sorted({k.strip().lower() for k in english_keywords if k and k.strip()}))
+
+_embed_cache = OrderedDict()  # text → 읽기 전용 벡터 (LRU)
+_embed_cache_lock = threading.Lock()
+_embed_cache_hits = 0
+_embed_cache_misses = 0
+
+def _embed_texts(texts: list[str]) -> np.ndarray:
+    """
+    여러 텍스트(쿼리 문자열 또는 단일 키워드)를 (n, D) 행렬로 임베딩합니다.
+    캐시에 없는 텍스트만 모아 한 번의 배치 임베딩 호출로 계산합니다.
+    """
+    global _embed_cache_hits, _embed_cache_misses
+    found = {}
+    with _embed_cache_lock:
+        for text in texts:
+            vec = _embed_cache.get(text)
+            if vec is not None:
+                _embed_cache.move_to_end(text)
+                found[text] = vec
+        _embed_cache_hits += sum(1 for t in texts if t in found)
+        missing = list(dict.fromkeys(t for t in texts if t not in found))
+        _embed_cache_misses += len(missing)
+
+    if missing:
+        vectors = np.asarray(_load_embedding_function().embed_documents(missing), dtype=np.float32)
+        vectors.setflags(write=False)
+        with _embed_cache_lock:
+            for text, vec in zip(missing, vectors):
+                found[text] = vec
+                _embed_cache[text] = vec
+                _embed_cache.move_to_end(text)
+            while len(_embed_cache) > EMBED_CACHE_SIZE:
+                _embed_cache.popitem(last=False)
+
+    return np.stack([found[t] for t in texts])
+
+def _embed_text(text: str) -> np.ndarray:
+    """단일 텍스트 임베딩 (캐시 사용)"""
+    return _embed_texts([text])[0]
+
+def embed_keywords(english_keywords: list[str]) -> np.ndarray:
+    """정규화된 키워드 집합을 하나의 쿼리 문자열로 합쳐 임베딩합니다. (캐시 사용)"""
+    return _embed_text(" ".join(_normalize_keywords(english_keywords)))
+
+def embedding_cache_stats() -> dict:
+    """임베딩 캐시 hit / miss / size를 반환합니다."""
+    with _embed_cache_lock:
+        return {"hits": _embed_cache_hits, "misses": _embed_cache_misses, "size": len(_embed_cache)}
+
+def _search_numpy(query_vec: np.ndarray, top_k: int, rows: np.ndarray | None = None) -> list[tuple[int, float]]:
+    """쿼리 벡터로 NumPy 인덱스에서 top-k (행 번호, 점수)를 찾습니다. (rows: 후보 행 제한)"""
+    return _load_song_index().search(query_vec, top_k, rows)
+
+# =========================================================
+# 2-2. 키워드별 임베딩 결합 (multi-vector 검색)
+# =========================================================
+def embed_keyword_matrix(english_keywords: list[str]) -> np.ndarray:
+    """키워드마다 따로 임베딩한 (K, D) 행렬. 키워드 벡터는 개별적으로 캐시됩니다."""
+    return _embed_texts(english_keywords)
+
+def _fuse_keyword_scores(scores: np.ndarray, fusion: str, weights: np.ndarray | None) -> np.ndarray:
+    """(K, N) 키워드별 점수를 (N,) 곡 점수로 결합합니다."""
+    if fusion == "max":
+        return scores.max(axis=0)
+    if weights is None:
+        weights = np.full(scores.shape[0], 1.0 / scores.shape[0], dtype=np.float32)
+    return weights @ scores
+
+def _search_numpy_multi(english_keywords: list[str], top_k: int, fusion: str,
+                        keyword_weights: list[float] | None = None,
+                        rows: np.ndarray | None = None) -> list[tuple[int, float]]:
+    """
+    키워드별 벡터 (K, D)와 곡 행렬 (N, D)을 한 번에 곱해 (K, N) 점수를 만든 뒤
+    가중합 또는 최댓값으로 결합하여 top-k (행 번호, 점수)를 찾습니다.
+    """
+    # 정규화 (소문자/공백 제거/중복 제거, 순서와 가중치는 유지)
+    pairs = {}
+    for i, kw in enumerate(english_keywords):
+        kw = (kw or "").strip().lower()
+        if kw and kw not in pairs:
+            pairs[kw] = keyword_weights[i] if keyword_weights else 1.0
+    keywords = list(pairs)
+    weights = np.asarray(list(pairs.values()), dtype=np.float32)
+    weights = weights / max(float(weights.sum()), 1e-12)
+
+    index = _load_song_index()
+    keyword_vecs = embed_keyword_matrix(keywords)
+    scores = np.asarray(index.scores(keyword_vecs, rows), dtype=np.float32)
+    fused = _fuse_keyword_scores(scores, fusion, weights)
+    if index.quantized:
+        # 압축 점수로 후보를 줄인 뒤 float32 원본으로 다시 결합 점수 계산
+        pool = top_k_indices(fused, max(top_k, RESCORE_POOL))
+        rows = pool if rows is None else rows[pool]
+        exact = np.asarray(index.scores(keyword_vecs, rows, exact=True), dtype=np.float32)
+        fused = _fuse_keyword_scores(exact, fusion, weights)
+    top = top_k_indices(fused, top_k)
+    if rows is None:
+        return [(int(i), float(fused[i])) for i in top]
+    return [(int(rows[i]), float(fused[i])) for i in top]
+
+# =========================================================
+# 2-3. 하이브리드 검색 (BM25 + 벡터, reciprocal-rank fusion)
+# =========================================================
+def _search_hybrid(english_keywords: list[str], top_k: int,
+                   rows: np.ndarray | None = None) -> list[tuple[int, float]]:
+    """
+    태그 BM25 검색과 벡터 검색을 두 스레드에서 동시에 수행하고 (각 HYBRID_POOL개)
+    순위를 RRF로 합쳐 top-k (행 번호, RRF 점수)를 반환합니다.
+    ("lounge", "chillout"처럼 태그에 그대로 있는 키워드는 BM25 쪽에서 확실히 잡힘)
+    """
+    query_tokens = [t for kw in _normalize_keywords(english_keywords) for t in keyword_terms(kw)]
+    pool_k = max(top_k, HYBRID_POOL)
+    _load_bm25_index()  # 인덱스 로드는 검색 스레드 밖에서 한 번만
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="rag") as pool:
+        dense = pool.submit(lambda: _search_numpy(embed_keywords(english_keywords), pool_k, rows))
+        lexical = pool.submit(_bm25_index.search, query_tokens, pool_k, rows)
+        dense_hits, lexical_hits = dense.result(), lexical.result()
+
+    print(f"   -> Hybrid candidates: {len(dense_hits)} dense, {len(lexical_hits)} lexical.")
+    fused = rrf_fuse([[i for i, _ in dense_hits], [i for i, _ in lexical_hits]], top_k, RRF_K)
+    # MMR 재순위화에서 곡 간 코사인 유사도와 척도를 맞추도록 최고점을 1.0으로 정규화
+    top = fused[0][1] if fused else 1.0
+    return [(i, score / top) for i, score in fused]
+
+# =========================================================
+# 2-4. 다양성 재순위화 (MMR / 태그 중복 제거)
+# =========================================================
+def _rerank(metadatas: list[dict], relevance: np.ndarray, cand_vecs: np.ndarray,
+            top_k: int, rerank: str) -> list[dict]:
+    """
+    후보 풀(RERANK_POOL개)에서 top_k개를 다양성을 고려해 다시 고릅니다.
+    추가 모델 호출 없이 후보 벡터만으로 계산합니다.
+    """
+    if rerank == "mmr":
+        order = mmr_select(relevance, cand_vecs, top_k, MMR_LAMBDA)
+    elif rerank == "dedup":
+        order = dedup_select([(m.get("genre_tags"), m.get("mood_tags")) for m in metadatas], top_k)
+    else:
+        order = range(min(top_k, len(metadatas)))
+    return [metadatas[i] for i in order]
+
+def _finalize_numpy_hits(hits: list[tuple[int, float]], top_k: int, rerank: str | None) -> list[dict]:
+    """NumPy 검색 결과 (행 번호, 점수)를 (필요 시 재순위화하여) 메타데이터로 바꿉니다."""
+    index = _load_song_index()
+    metadatas = [index.metadata(i) for i, _ in hits]
+    if not rerank:
+        return metadatas
+    rows = np.asarray([i for i, _ in hits], dtype=np.int64)
+    relevance = np.asarray([score for _, score in hits], dtype=np.float32)
+    return _rerank(metadatas, relevance, index.vectors[rows], top_k, rerank)
+
 # =========================================================
 # 3. RAG 검색 함수 (Agent 3에서 이 함수를 호출)
 # =========================================================
-def get_song_recommendations(english_keywords: list[str], top_k: int = 5) -> list[dict]:
+def get_song_recommendations(english_keywords: list[str], top_k: int = 5, backend: str | None = None,
+                             query_mode: str | None = None, fusion: str | None = None,
+                             keyword_weights: list[float] | None = None,
+                             must_have_genres: list[str] | None = None,
+                             exclude_moods: list[str] | None = None,
+                             rerank: str | None = None) -> list[dict]:
     """
     영어 키워드 리스트를 기반으로 ChromaDB에서 유사한 노래를 검색합니다.
     
     Args:
         english_keywords (list[str]): Agent 3가 추출한 키워드 (예: ["angry", "rock"])
         top_k (int): 추천할 노래 개수
+        backend (str | None): "chroma" 또는 "numpy" (None이면 RETRIEVER_BACKEND)
+        query_mode (str | None): "joined", "multi" 또는 "hybrid" (None이면 QUERY_MODE)
+        fusion (str | None): "multi" 모드의 "sum" 또는 "max" (None이면 KEYWORD_FUSION)
+        keyword_weights (list[float] | None): "sum" 결합 시 키워드별 가중치 (기본: 균등)
+        must_have_genres (list[str] | None): 이 장르를 모두 가진 곡만 후보로 사용
+        exclude_moods (list[str] | None): 이 무드 중 하나라도 가진 곡은 제외
+            (태그 필터는 태그 역색인 + NumPy 인덱스로 처리됩니다)
+        rerank (str | None): "mmr" 또는 "dedup" — RERANK_POOL개 후보를 가져와 다양성 재순위화
+            (None이면 RERANK_MODE)
 
     Returns:
         list[dict]: 노래 메타데이터 딕셔너리의 리스트
     """
+    backend = backend or RETRIEVER_BACKEND
+    query_mode = query_mode or QUERY_MODE
+    rerank = rerank or RERANK_MODE
+    pool_k = max(top_k, RERANK_POOL) if rerank else top_k
     try:
-        # 1. DB 및 모델 로드 (캐시 활용)
-        vector_db, _ = _load_retriever_resources()
-        
         if not english_keywords:
             print("⚠️ [RAG] No keywords provided, skipping recommendation.")
             return []
+
+        # 0-a. 태그 사전 필터 → 후보 행 (Chroma는 "태그 포함" 필터를 지원하지 않으므로 NumPy 사용)
+        rows = _candidate_rows(must_have_genres, exclude_moods)
+        if rows is not None:
+            print(f"🏷️  [RAG] Tag filter kept {len(rows)} candidate songs.")
+            backend = "numpy"
+
+        # 0-b. 키워드별 임베딩 결합 모드 (항상 NumPy 곡 행렬 사용)
+        if query_mode == "multi":
+            fusion = fusion or KEYWORD_FUSION
+            print(f"🔍 [RAG] Multi-vector search for: {english_keywords} (Top {top_k}, {fusion})")
+            hits = _search_numpy_multi(english_keywords, pool_k, fusion, keyword_weights, rows)
+            recommendations = _finalize_numpy_hits(hits, top_k, rerank)
+            print(f"   -> Found {len(recommendations)} recommendations.")
+            return recommendations
+
+        # 0-c. 하이브리드 모드 (태그 BM25 + 벡터 검색, NumPy 인덱스 사용)
+        if query_mode == "hybrid":
+            print(f"🔍 [RAG] Hybrid search for: {english_keywords} (Top {top_k})")
+            hits = _search_hybrid(english_keywords, pool_k, rows)
+            recommendations = _finalize_numpy_hits(hits, top_k, rerank)
+            print(f"   -> Found {len(recommendations)} recommendations.")
+            return recommendations
             
-        # 2. 쿼리 생성 (키워드를 하나의 텍스트로 합침)
-        query_text = " ".join(english_keywords)
-        print(f"🔍 [RAG] Searching for: '{query_text}' (Top {top_k})")
+        # 1. 쿼리 생성 (정규화된 키워드를 하나의 텍스트로 합침) + 임베딩 (캐시 활용)
+        query_text = " ".join(_normalize_keywords(english_keywords))
+        print(f"🔍 [RAG] Searching for: '{query_text}' (Top {top_k}, {backend})")
+        query_vec = embed_keywords(english_keywords)
+
+        # 2-a. NumPy 인덱스 검색 (Chroma/LangChain 오버헤드 없음)
+        if backend == "numpy":
+            hits = _search_numpy(query_vec, pool_k, rows)
+            recommendations = _finalize_numpy_hits(hits, top_k, rerank)
+            print(f"   -> Found {len(recommendations)} recommendations.")
+            return recommendations
+
+        # 2-b. DB 및 모델 로드 (캐시 활용)
+        vector_db, _ = _load_retriever_resources()
         
         # 3. LangChain RAG 검색 (유사도 검색)
-        #    (LangChain이 내부적으로 query_text를 임베딩하여 DB와 비교)
-        results = vector_db.similarity_search(query_text, k=top_k)
-        
-        # 4. 결과에서 메타데이터만 추출
-        recommendations = [doc.metadata for doc in results]
+        #    (캐시된 쿼리 벡터로 바로 검색 → 재임베딩 없음)
+        if rerank:
+            # 재순위화에는 후보 벡터가 필요하므로 컬렉션에 직접 질의
+            found = vector_db._collection.query(
+                query_embeddings=[query_vec.tolist()], n_results=pool_k,
+                include=["metadatas", "embeddings"]
+            )
+            cand_vecs = np.asarray(found["embeddings"][0], dtype=np.float32)
+            recommendations = _rerank(list(found["metadatas"][0]), cand_vecs @ query_vec,
+                                      cand_vecs, top_k, rerank)
+        else:
+            results = vector_db.similarity_search_by_vector(query_vec.tolist(), k=top_k)
+
+            # 4. 결과에서 메타데이터만 추출
+            recommendations = [doc.metadata for doc in results]
         
         print(f"   -> Found {len(recommendations)} recommendations.")
         return recommendations
@@ -99,6 +413,168 @@ def get_song_recommendations(english_keywords: list[str], top_k: int = 5) -> lis
         print(f"🔥 [RAG] Error during similarity search: {e}")
         return []
 
+# =========================================================
+# 3-1. 배치 검색 (여러 키워드 리스트를 한 번에)
+# =========================================================
+def get_song_recommendations_batch(keyword_lists: list[list[str]], top_k: int = 5,
+                                   backend: str | None = None) -> list[list[dict]]:
+    """
+    여러 키워드 리스트에 대한 추천을 한 번에 계산합니다.
+    (오프라인 평가, 캐시 워밍, 여러 세션 동시 처리용)
+    - 모든 쿼리를 한 번의 배치 임베딩 호출로 인코딩 (캐시에 없는 것만)
+    - 한 번의 배치 top-k 검색 (NumPy: (Q, N) 행렬 곱 / Chroma: query_embeddings 일괄 질의)
+
+    Returns:
+        list[list[dict]]: 입력 순서대로 쿼리별 노래 메타데이터 리스트 (빈 키워드는 [])
+    """
+    backend = backend or RETRIEVER_BACKEND
+    results = [[] for _ in keyword_lists]
+    try:
+        query_texts = [" ".join(_normalize_keywords(kws or [])) for kws in keyword_lists]
+        active = [i for i, q in enumerate(query_texts) if q]
+        if not active:
+            return results
+        print(f"🔍 [RAG] Batch searching {len(active)} queries (Top {top_k}, {backend})")
+        query_vecs = _embed_texts([query_texts[i] for i in active])
+
+        if backend == "numpy":
+            index = _load_song_index()
+            for i, hits in zip(active, index.search_batch(query_vecs, top_k)):
+                results[i] = [index.metadata(j) for j, _ in hits]
+            return results
+
+        vector_db, _ = _load_retriever_resources()
+        found = vector_db._collection.query(
+            query_embeddings=query_vecs.tolist(), n_results=top_k, include=["metadatas"]
+        )
+        for i, metas in zip(active, found["metadatas"]):
+            results[i] = list(metas)
+        return results
+
+    except Exception as e:
+        print(f"🔥 [RAG] Error during batch similarity search: {e}")
+        return results
+
+# =========================================================
+# 3-2. 통합 카탈로그 검색 (Jamendo + Spotify)
+# =========================================================
+# 카탈로그별 최대 추천 개수 (None이면 제한 없음)
+CATALOG_QUOTAS = {"jamendo": None, "spotify": None}
+
+_catalog_dbs = {}
+_catalog_lock = threading.Lock()
+
+def _load_catalog(catalog: str):
+    """카탈로그별 Chroma 컬렉션을 한 번만 로드합니다. (DB가 없으면 None)"""
+    with _catalog_lock:
+        if catalog in _catalog_dbs:
+            return _catalog_dbs[catalog]
+
+        if catalog == "jamendo":
+            if not os.path.exists(DB_PERSIST_DIR):
+                print(f"⚠️ [RAG] Jamendo DB not found, skipping: {DB_PERSIST_DIR}")
+                vector_db = None
+            else:
+                vector_db, _ = _load_retriever_resources()
+        else:
+            if not os.path.exists(SPOTIFY_DB_PERSIST_DIR):
+                print(f"⚠️ [RAG] Spotify DB not found, skipping: {SPOTIFY_DB_PERSIST_DIR}")
+                vector_db = None
+            else:
+                print(f"🚀 [RAG] Loading ChromaDB from: {SPOTIFY_DB_PERSIST_DIR}")
+                vector_db = Chroma(
+                    persist_directory=SPOTIFY_DB_PERSIST_DIR,
+                    embedding_function=_load_embedding_function(),
+                    collection_name=SPOTIFY_COLLECTION_NAME
+                )
+        _catalog_dbs[catalog] = vector_db
+        return vector_db
+
+def _normalize_song(catalog: str, meta: dict) -> dict:
+    """카탈로그마다 다른 메타데이터를 공통 형식으로 맞춥니다."""
+    if catalog == "spotify":
+        return {
+            "catalog": catalog,
+            "track_id": meta.get("track_id", ""),
+            "title": meta.get("track_name", ""),
+            "artist": meta.get("artist", ""),
+            "genre_tags": meta.get("genre", ""),
+            "mood_tags": meta.get("mood_tags", ""),
+            "path": "",
+        }
+    return {
+        "catalog": catalog,
+        "track_id": meta.get("track_id", ""),
+        "title": "",
+        "artist": "",
+        "genre_tags": meta.get("genre_tags", ""),
+        "mood_tags": meta.get("mood_tags", ""),
+        "path": meta.get("path", ""),
+    }
+
+def _search_catalog(catalog: str, query_vec: np.ndarray, k: int) -> list[tuple[float, dict]]:
+    """
+    한 카탈로그에서 (코사인 유사도, 공통 메타데이터) 후보를 찾습니다.
+    카탈로그마다 임베딩 정규화/거리 함수가 다를 수 있으므로 점수는 벡터로 직접 계산합니다.
+    """
+    vector_db = _load_catalog(catalog)
+    if vector_db is None:
+        return []
+    found = vector_db._collection.query(
+        query_embeddings=[query_vec.tolist()], n_results=k, include=["metadatas", "embeddings"]
+    )
+    metas = found["metadatas"][0]
+    if not metas:
+        return []
+    vecs = np.asarray(found["embeddings"][0], dtype=np.float32)
+    cosine = (vecs @ query_vec) / np.maximum(np.linalg.norm(vecs, axis=1) * np.linalg.norm(query_vec), 1e-12)
+    return [(float(score), _normalize_song(catalog, meta)) for score, meta in zip(cosine, metas)]
+
+def get_song_recommendations_federated(english_keywords: list[str], top_k: int = 5,
+                                       quotas: dict[str, int | None] | None = None) -> list[dict]:
+    """
+    Jamendo와 Spotify 컬렉션을 동시에 검색하고 점수 순으로 합칩니다.
+
+    Args:
+        english_keywords (list[str]): 검색 키워드
+        top_k (int): 추천할 노래 개수
+        quotas (dict | None): 카탈로그별 최대 개수 (None이면 CATALOG_QUOTAS)
+
+    Returns:
+        list[dict]: 공통 형식 메타데이터 (catalog, track_id, title, artist, genre_tags, mood_tags, path, score)
+    """
+    quotas = CATALOG_QUOTAS if quotas is None else quotas
+    try:
+        if not english_keywords:
+            print("⚠️ [RAG] No keywords provided, skipping recommendation.")
+            return []
+        query_vec = embed_keywords(english_keywords)
+        catalogs = list(quotas)
+        print(f"🔍 [RAG] Federated search over {catalogs} (Top {top_k})")
+
+        with ThreadPoolExecutor(max_workers=len(catalogs), thread_name_prefix="rag") as pool:
+            per_catalog = pool.map(lambda c: _search_catalog(c, query_vec, top_k), catalogs)
+            candidates = [hit for hits in per_catalog for hit in hits]
+
+        candidates.sort(key=lambda hit: hit[0], reverse=True)
+        counts = dict.fromkeys(catalogs, 0)
+        recommendations = []
+        for score, song in candidates:
+            limit = quotas.get(song["catalog"])
+            if limit is not None and counts[song["catalog"]] >= limit:
+                continue
+            counts[song["catalog"]] += 1
+            recommendations.append({**song, "score": round(score, 4)})
+            if len(recommendations) >= top_k:
+                break
+
+        print(f"   -> Found {len(recommendations)} recommendations {counts}.")
+        return recommendations
+
+    except Exception as e:
+        print(f"🔥 [RAG] Error during federated search: {e}")
+        return []
+
 # =========================================================
 # 4. 테스트 실행
 # =========================================================
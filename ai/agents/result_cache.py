@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+result_cache.py
+- 결정적(deterministic)인 모델 결과를 재사용하기 위한 공용 캐시입니다.
+- 1단계: 메모리 LRU (크기 제한)
+- 2단계: (선택) SQLite 파일 — 프로세스를 재시작해도 유지됩니다.
+- hit / miss 카운터를 제공합니다.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+    """
+    문자열 key → 문자열 value 캐시.
+
+    Args:
+        maxsize (int): 메모리 LRU에 보관할 최대 항목 수
+        db_path (str | None): SQLite 파일 경로 (None이면 메모리만 사용)
+        table (str): SQLite 테이블 이름
+    """
+    def __init__(self, maxsize: int = 1024, db_path: str | None = None, table: str = "cache"):
+        self.maxsize = maxsize
+        self.table = table
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ [Cache] Disk cache disabled ({db_path}): {e}")
+                self._db = None
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            value = self._lru.get(key)
+            if value is not None:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return value
+
+            if self._db is not None:
+                row = self._db.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._remember(key, row[0])
+                    self.hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str):
+        with self._lock:
+            self._remember(key, value)
+            if self._db is not None:
+                self._db.execute(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", (key, value))
+                self._db.commit()
+
+    def _remember(self, key: str, value: str):
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.maxsize:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._lru),
+                    "persistent": self._db is not None}
@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+"""
+vector_index.py
+- build_chromadb_jamendo.py가 내보낸 NumPy 인덱스(rag/numpy_index)를 로드합니다.
+  - embeddings.npy : (N, D) 정규화된 곡 임베딩 행렬 (float32 또는 float16, memory-map 로드)
+  - metadata.json  : 열(column) 단위 메타데이터 {"track_id": [...], "path": [...], ...}
+  - (선택) embeddings_int8.npy + scales_int8.npy / embeddings_float16.npy : 압축 저장본
+- Chroma/LangChain 없이 행렬-벡터 곱 한 번 + argpartition으로 top-k 검색을 수행합니다.
+- 압축 저장본을 쓰면 압축 행렬로 대략적인 top-k 후보를 고른 뒤,
+  후보만 float32 원본(memory-map)으로 다시 점수를 계산(rescoring)합니다.
+- 태그 텍스트 BM25 역색인(BM25Index)과 reciprocal-rank fusion(rrf_fuse)도 제공합니다.
+"""
+
+import os
+import re
+import json
+from collections import Counter
+import numpy as np
+
+EMBEDDINGS_FILE = "embeddings.npy"
+METADATA_FILE = "metadata.json"
+QUANTIZED_FILES = {
+    "int8": ("embeddings_int8.npy", "scales_int8.npy"),
+    "float16": ("embeddings_float16.npy", None),
+}
+SCORE_BLOCK_ROWS = 8192  # 압축 행렬을 float32로 바꿀 때 한 번에 처리할 행 수 (임시 메모리 제한)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    점수 배열에서 상위 k개의 인덱스를 점수 내림차순으로 반환합니다.
+    (전체 정렬 대신 argpartition 사용: O(N))
+    scores가 (Q, N)이면 행마다 top-k를 구해 (Q, k)를 반환합니다.
+    """
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+class SongIndex:
+    """
+    메모리 상의 곡 임베딩 행렬 + 메타데이터.
+
+    Args:
+        vectors (np.ndarray): (N, D) 정규화된 임베딩 (코사인 유사도 = 내적)
+        columns (dict[str, list]): 열 단위 메타데이터, 각 리스트 길이는 N
+        codes (np.ndarray | None): (N, D) 압축 행렬 (int8 또는 float16). 있으면 대략 검색에 사용
+        scales (np.ndarray | None): (N,) int8 행별 스케일 (float16이면 None)
+        rescore_pool (int): 압축 검색 후 float32로 다시 점수를 매길 후보 수
+    """
+    def __init__(self, vectors: np.ndarray, columns: dict[str, list],
+                 codes: np.ndarray | None = None, scales: np.ndarray | None = None,
+                 rescore_pool: int = 200):
+        self.vectors = vectors
+        self.columns = columns
+        self.codes = codes
+        self.scales = scales
+        self.rescore_pool = rescore_pool
+        self._fields = list(columns.keys())
+
+    @classmethod
+    def load(cls, index_dir: str, mmap: bool = True, storage: str = "float32",
+             rescore_pool: int = 200) -> "SongIndex":
+        """
+        storage: "float32" (원본만 사용), "int8" 또는 "float16" (압축본을 메모리에 올리고
+        float32 원본은 memory-map으로 두어 rescoring할 후보 행만 읽음)
+        """
+        vectors = np.load(os.path.join(index_dir, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+        with open(os.path.join(index_dir, METADATA_FILE), "r", encoding="utf-8") as f:
+            columns = json.load(f)
+
+        codes, scales = None, None
+        if storage != "float32":
+            codes_file, scales_file = QUANTIZED_FILES[storage]
+            codes = np.load(os.path.join(index_dir, codes_file))
+            if scales_file:
+                scales = np.load(os.path.join(index_dir, scales_file)).astype(np.float32)
+        return cls(vectors, columns, codes, scales, rescore_pool)
+
+    @property
+    def quantized(self) -> bool:
+        return self.codes is not None
+
+    def __len__(self) -> int:
+        return self.vectors.shape[0]
+
+    def metadata(self, i: int) -> dict:
+        """i번째 곡의 메타데이터를 Chroma와 같은 dict 형태로 반환합니다."""
+        return {field: self.columns[field][i] for field in self._fields}
+
+    def scores(self, query_vec: np.ndarray, rows: np.ndarray | None = None, exact: bool = False) -> np.ndarray:
+        """
+        쿼리 벡터(들)와 곡들의 내적. (D,) → (N,), (Q, D) → (Q, N)
+        rows가 주어지면 해당 행(후보 곡)만 계산합니다. (결과 길이 = len(rows))
+        압축 인덱스이면서 exact=False이면 압축 행렬로 계산한 근사 점수를 반환합니다.
+        """
+        q = np.asarray(query_vec, dtype=np.float32)
+        if self.quantized and not exact:
+            matrix = self.codes if rows is None else self.codes[rows]
+            scores = _blockwise_matmul(matrix, q)
+            if self.scales is not None:
+                scores *= self.scales if rows is None else self.scales[rows]
+            return scores
+        matrix = self.vectors if rows is None else self.vectors[rows]
+        return (matrix @ q.T).T if q.ndim == 2 else matrix @ q
+
+    def search(self, query_vec: np.ndarray, k: int, rows: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """상위 k개의 (행 인덱스, 점수) 리스트를 반환합니다. (rows: 후보 행 제한)"""
+        scores = np.asarray(self.scores(query_vec, rows), dtype=np.float32)
+        if self.quantized:
+            # 1) 압축 점수로 후보 rescore_pool개 → 2) float32 원본으로 정확한 점수
+            pool = top_k_indices(scores, max(k, self.rescore_pool))
+            rows = pool if rows is None else rows[pool]
+            scores = np.asarray(self.scores(query_vec, rows, exact=True), dtype=np.float32)
+        idx = top_k_indices(scores, k)
+        if rows is None:
+            return [(int(i), float(scores[i])) for i in idx]
+        return [(int(rows[i]), float(scores[i])) for i in idx]
+
+    def search_batch(self, query_vecs: np.ndarray, k: int) -> list[list[tuple[int, float]]]:
+        """(Q, D) 쿼리 행렬에 대해 한 번의 행렬 곱으로 쿼리별 top-k를 구합니다."""
+        scores = np.asarray(self.scores(query_vecs), dtype=np.float32)
+        if not self.quantized:
+            top = top_k_indices(scores, k)
+            return [[(int(i), float(row_scores[i])) for i in row] for row, row_scores in zip(top, scores)]
+
+        results = []
+        for q, pool in zip(query_vecs, top_k_indices(scores, max(k, self.rescore_pool))):
+            exact = np.asarray(self.scores(q, pool, exact=True), dtype=np.float32)
+            results.append([(int(pool[i]), float(exact[i])) for i in top_k_indices(exact, k)])
+        return results
+
+def _blockwise_matmul(matrix: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """
+    압축 행렬(int8/float16) × float32 쿼리. 행 블록 단위로 float32 변환하여
+    전체 행렬의 float32 사본이 한 번에 생기지 않도록 합니다.
+    """
+    n = matrix.shape[0]
+    out = np.empty((n,) + q.shape[:-1], dtype=np.float32)
+    for start in range(0, n, SCORE_BLOCK_ROWS):
+        block = matrix[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+        out[start:start + SCORE_BLOCK_ROWS] = block @ q.T if q.ndim == 2 else block @ q
+    return out.T if q.ndim == 2 else out
+
+# =========================================================
+# 태그 역색인 (tag → 곡 bitmap)
+# =========================================================
+TAG_INDEX_FILE = "tag_index.npz"
+
+class TagIndex:
+    """
+    장르/무드 태그 → 곡 행(row) bitmap 역색인. (build_chromadb_jamendo.py가 생성)
+    태그 사전은 Jamendo ETL의 태그 행렬(jamendo/tag_matrix.py)과 같고,
+    bitmap은 np.packbits로 압축된 (T, ceil(N/8)) uint8 행렬이며
+    행 순서는 embeddings.npy와 같습니다.
+    """
+    def __init__(self, n: int, vocabs: dict[str, list[str]], bitmaps: dict[str, np.ndarray]):
+        self.n = n
+        self.vocabs = vocabs
+        self.bitmaps = bitmaps
+        # 조회는 대소문자 무시
+        self.tag_ids = {field: {tag.lower(): i for i, tag in enumerate(vocab)} for field, vocab in vocabs.items()}
+
+    @classmethod
+    def load(cls, index_dir: str) -> "TagIndex":
+        with np.load(os.path.join(index_dir, TAG_INDEX_FILE)) as data:
+            n = int(data["n"])
+            vocabs = {f: data[f"{f}_vocab"].tolist() for f in ("genre", "mood")}
+            bitmaps = {f: data[f"{f}_bits"] for f in ("genre", "mood")}
+        return cls(n, vocabs, bitmaps)
+
+    def _rows(self, field: str, tag: str) -> np.ndarray:
+        """태그를 가진 곡의 bool mask (N,). 모르는 태그면 모두 False."""
+        i = self.tag_ids[field].get(tag.strip().lower())
+        if i is None:
+            return np.zeros(self.n, dtype=bool)
+        return np.unpackbits(self.bitmaps[field][i], count=self.n).astype(bool)
+
+    def postings(self):
+        """(field, 태그, 곡 행 배열)을 태그마다 yield 합니다. (BM25 색인 생성용)"""
+        for field, vocab in self.vocabs.items():
+            for i, tag in enumerate(vocab):
+                yield field, tag, np.flatnonzero(np.unpackbits(self.bitmaps[field][i], count=self.n))
+
+    def mask(self, must_have_genres: list[str] | None = None,
+             exclude_moods: list[str] | None = None) -> np.ndarray:
+        """
+        필터 조건을 만족하는 곡의 bool mask (N,)를 반환합니다.
+        - must_have_genres: 나열한 장르를 *모두* 가진 곡만
+        - exclude_moods: 나열한 무드 중 *하나라도* 가진 곡 제외
+        """
+        mask = np.ones(self.n, dtype=bool)
+        for tag in must_have_genres or []:
+            mask &= self._rows("genre", tag)
+        for tag in exclude_moods or []:
+            mask &= ~self._rows("mood", tag)
+        return mask
+
+# =========================================================
+# 다양성 재순위화 (MMR / 태그 중복 제거)
+# =========================================================
+def mmr_select(relevance: np.ndarray, cand_vecs: np.ndarray, k: int, lambda_: float = 0.7) -> np.ndarray:
+    """
+    Maximal Marginal Relevance로 후보 중 k개를 고릅니다. (선택 순서대로 후보 위치 반환)
+    score = λ·relevance − (1−λ)·max(선택된 곡과의 유사도)
+    후보 간 유사도 행렬 (P, P)을 한 번에 계산하고, 이후 k번의 벡터 연산만 수행합니다.
+    """
+    relevance = np.asarray(relevance, dtype=np.float32)
+    p = relevance.shape[0]
+    k = min(k, p)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+
+    vecs = np.asarray(cand_vecs, dtype=np.float32)
+    sim = vecs @ vecs.T
+    selected = np.empty(k, dtype=np.int64)
+    max_sim = np.full(p, -np.inf, dtype=np.float32)  # 선택된 곡들과의 최대 유사도
+    available = np.ones(p, dtype=bool)
+    for step in range(k):
+        if step == 0:
+            mmr = relevance.copy()
+        else:
+            mmr = lambda_ * relevance - (1.0 - lambda_) * max_sim
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected[step] = best
+        available[best] = False
+        np.maximum(max_sim, sim[best], out=max_sim)
+    return selected
+
+def dedup_select(keys: list, k: int) -> np.ndarray:
+    """
+    같은 key(예: (genre_tags, mood_tags))를 가진 후보는 처음 것만 고르고,
+    k개가 안 되면 남은 후보를 원래 순서대로 채웁니다.
+    """
+    seen = set()
+    first, rest = [], []
+    for i, key in enumerate(keys):
+        (rest if key in seen else first).append(i)
+        seen.add(key)
+    return np.asarray((first + rest)[:k], dtype=np.int64)
+
+# =========================================================
+# 어휘(BM25) 검색 + 순위 결합 (하이브리드 검색용)
+# =========================================================
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tag_term(tag: str) -> str:
+    """태그 → BM25 색인어 (소문자, 영숫자만: "Hip-Hop" → "hiphop")"""
+    return "".join(_TOKEN_RE.findall(str(tag or "").lower()))
+
+def keyword_terms(keyword: str) -> list[str]:
+    """
+    쿼리 키워드 → 색인어 목록: 키워드 전체 + 단어별.
+    ("easy listening" → ["easylistening", "easy", "listening"]; 태그 사전의 붙여 쓴 태그와 맞춤)
+    """
+    words = _TOKEN_RE.findall(str(keyword or "").lower())
+    return list(dict.fromkeys(["".join(words)] + words)) if words else []
+
+class BM25Index:
+    """
+    토큰 → (곡 행 배열, BM25 가중치 배열) 메모리 역색인.
+    곡별 BM25 가중치(idf · tf 정규화)를 생성 시 미리 계산해 두므로,
+    질의는 쿼리 토큰의 posting을 점수 배열에 더하는 것으로 끝납니다.
+
+    Args:
+        docs (list[list[str]]): 곡별 색인어 목록 (행 순서 = SongIndex 행 순서)
+        k1 (float), b (float): BM25 파라미터
+    """
+    def __init__(self, docs: list[list[str]], k1: float = 1.2, b: float = 0.75):
+        self.n = len(docs)
+        lengths = np.fromiter((len(d) for d in docs), dtype=np.float32, count=self.n)
+        avgdl = max(float(lengths.mean()), 1e-9) if self.n else 1.0
+
+        rows_by_term, tfs_by_term = {}, {}
+        for row, tokens in enumerate(docs):
+            for term, tf in Counter(tokens).items():
+                rows_by_term.setdefault(term, []).append(row)
+                tfs_by_term.setdefault(term, []).append(tf)
+
+        self.postings = {}
+        for term, rows in rows_by_term.items():
+            rows = np.asarray(rows, dtype=np.int32)
+            tf = np.asarray(tfs_by_term[term], dtype=np.float32)
+            idf = np.log(1.0 + (self.n - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = tf + k1 * (1.0 - b + b * lengths[rows] / avgdl)
+            self.postings[term] = (rows, (idf * tf * (k1 + 1.0) / norm).astype(np.float32))
+
+    @classmethod
+    def from_tag_index(cls, tag_index: "TagIndex", **params) -> "BM25Index":
+        """태그 역색인의 태그 사전/곡별 태그로 만듭니다. (태그 문자열을 다시 split하지 않음)"""
+        docs = [[] for _ in range(tag_index.n)]
+        for _, tag, rows in tag_index.postings():
+            term = tag_term(tag)
+            for row in rows:
+                docs[row].append(term)
+        return cls(docs, **params)
+
+    def scores(self, query_tokens: list[str]) -> np.ndarray:
+        """(N,) BM25 점수. 쿼리 토큰 중복은 한 번만 셉니다."""
+        scores = np.zeros(self.n, dtype=np.float32)
+        for term in set(query_tokens):
+            posting = self.postings.get(term)
+            if posting is not None:
+                scores[posting[0]] += posting[1]  # 한 posting 안의 행은 중복 없음
+        return scores
+
+    def search(self, query_tokens: list[str], k: int, rows: np.ndarray | None = None) -> list[tuple[int, float]]:
+        """점수 > 0인 상위 k개의 (행 인덱스, 점수). (rows: 후보 행 제한)"""
+        scores = self.scores(query_tokens)
+        if rows is not None:
+            scores = scores[rows]
+        idx = [i for i in top_k_indices(scores, k) if scores[i] > 0]
+        if rows is None:
+            return [(int(i), float(scores[i])) for i in idx]
+        return [(int(rows[i]), float(scores[i])) for i in idx]
+
+def rrf_fuse(rankings: list[list[int]], k: int, rrf_k: int = 60) -> list[tuple[int, float]]:
+    """
+    Reciprocal-rank fusion: 순위 목록들을 score = Σ 1 / (rrf_k + rank) 로 합칩니다.
+    점수 척도가 다른 검색기(BM25, 코사인)의 결과를 정규화 없이 결합할 수 있습니다.
+    """
+    fused = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            fused[item] = fused.get(item, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)[:k]
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+pipeline.py
+- 카탈로그 빌드 전체(TSV → 태그 파싱 → 병합 → 정제 → Chroma/NumPy 인덱스)를 실행하는 진입점입니다.
+- build_graph()가 정의한 단계 간 의존 관계(deps)를 따라 위상 순서로 실행합니다.
+- 단계 사이에서는 CSV를 다시 파싱하지 않고 DataFrame을 메모리로 넘깁니다.
+- 각 단계 결과는 타입이 지정된 Parquet(태그 컬럼은 category)으로 저장합니다.
+- 입력 파일 해시와 단계 코드 해시가 지난 실행과 같고 출력이 모두 있으면 건너뜁니다. (pipeline_state.json)
+  (다시 실행한 단계의 출력 내용이 그대로이면 하위 단계도 건너뜀)
+- 최종 결과는 기존과 같이 cleaned_merged_tags.csv 로도 저장합니다. (build_chromadb_jamendo.py 입력)
+- 정제 결과로 태그 사전 + 곡별 multi-hot 비트 행렬(tag_matrix.py)도 만듭니다.
+- 단계별 실행 시간을 마지막에 요약해서 출력합니다.
+"""
+
+import os
+import sys
+import json
+import time
+import inspect
+import hashlib
+import subprocess
+from graphlib import TopologicalSorter
+import pandas as pd
+
+import tag_etl
+import tag_matrix
+from tag_etl import GENRE_TSV, MOOD_TSV, DATA_DIR, parse_autotagging
+
+# =========================================================
+# 1. 설정
+# =========================================================
+GENRE_PARQUET = os.path.join(DATA_DIR, "processed_genre_tags.parquet")
+MOOD_PARQUET = os.path.join(DATA_DIR, "processed_mood_tags.parquet")
+MERGED_PARQUET = os.path.join(DATA_DIR, "merged_tags.parquet")
+CLEANED_PARQUET = os.path.join(DATA_DIR, "cleaned_merged_tags.parquet")
+CLEANED_CSV = os.path.join(DATA_DIR, "cleaned_merged_tags.csv")
+STATE_FILE = os.path.join(DATA_DIR, "pipeline_state.json")
+
+# Chroma / NumPy 인덱스 단계 (build_chromadb_jamendo.py를 ai/ 폴더 기준으로 실행)
+AI_DIR = os.path.dirname(tag_etl.BASE_DIR)
+BUILD_SCRIPT = os.path.join(AI_DIR, "rag", "build_chromadb_jamendo.py")
+INDEX_OUTPUTS = [
+    os.path.join(AI_DIR, "rag", "chroma_db", "content_hashes.json"),
+    os.path.join(AI_DIR, "rag", "numpy_index", "embeddings.npy"),
+    os.path.join(AI_DIR, "rag", "numpy_index", "metadata.json"),
+    os.path.join(AI_DIR, "rag", "numpy_index", "tag_index.npz"),
+]
+BUILD_INDEX = True  # False이면 cleaned_merged_tags까지만 실행
+
+KEY_COLUMNS = ["TRACK_ID", "PATH", "genre_tags", "mood_tags"]
+CATEGORY_COLUMNS = ["genre_tags", "mood_tags"]  # 태그 조합 수가 제한적이라 category로 저장
+
+# =========================================================
+# 2. 단계 캐시 (입력·코드 해시 → 건너뛰기)
+# =========================================================
+def file_digest(path: str) -> str:
+    """파일 내용 SHA-256 (조각 단위로 읽음)"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _load_state() -> dict:
+    if not os.path.exists(STATE_FILE):
+        return {}
+    try:
+        with open(STATE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+def _save_state(state: dict):
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+def _typed(df: pd.DataFrame) -> pd.DataFrame:
+    """ID/경로는 string, 태그는 category로 변환합니다."""
+    df = df.copy()
+    for col in df.columns:
+        df[col] = df[col].astype("category" if col in CATEGORY_COLUMNS else "string")
+    return df
+
+def code_digest(code: list) -> str:
+    """
+    단계 코드의 해시. 항목이 파일 경로면 파일 내용, 함수면 소스 코드를 사용합니다.
+    (코드가 바뀌면 입력이 같아도 단계를 다시 실행)
+    """
+    h = hashlib.sha256()
+    for item in code:
+        if callable(item):
+            h.update(inspect.getsource(item).encode("utf-8"))
+        else:
+            h.update(file_digest(item).encode("ascii"))
+    return h.hexdigest()
+
+def run_stage(state: dict, name: str, inputs: list[str], outputs: list[str], fn,
+              code: list | None = None, force: bool = False):
+    """
+    입력 파일 해시와 코드 해시가 지난 실행과 같고 출력이 모두 있으면 fn을 건너뜁니다.
+    fn은 단계를 실행하고 결과 DataFrame을 반환합니다. (건너뛰면 None)
+    반환값: (결과, 실행 여부, 소요 시간)
+    """
+    fingerprint = {
+        "inputs": {path: file_digest(path) for path in inputs},
+        "code": code_digest(code or [fn]),
+    }
+    prev = state.get(name)
+    if not force and prev == fingerprint and all(os.path.exists(p) for p in outputs):
+        print(f"⏭️  [{name}] up to date, skipped.")
+        return None, False, 0.0
+
+    print(f"▶️  [{name}] running...")
+    started = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - started
+    state[name] = fingerprint
+    _save_state(state)
+    print(f"✅ [{name}] done in {elapsed:.2f}s")
+    return result, True, elapsed
+
+# =========================================================
+# 3. 단계 정의
+# =========================================================
+def _parse_stage(tsv_path: str, column: str, out_path: str):
+    def fn():
+        tags_df = parse_autotagging([tsv_path])
+        df = _typed(tags_df.loc[tags_df[column].notna(), ["TRACK_ID", "PATH", column]])
+        df.to_parquet(out_path, index=False)
+        print(f"   -> {len(df)} tracks with {column} → {out_path}")
+        return df
+    return fn
+
+def merge_tags(genre_df: pd.DataFrame, mood_df: pd.DataFrame) -> pd.DataFrame:
+    """TRACK_ID 기준 inner join (PATH는 genre 쪽 사용)"""
+    merged = pd.merge(genre_df, mood_df[["TRACK_ID", "mood_tags"]], on="TRACK_ID", how="inner")
+    return _typed(merged[KEY_COLUMNS])
+
+def clean_tags(merged_df: pd.DataFrame) -> pd.DataFrame:
+    """4개 열 모두 값이 있는 행만 남깁니다."""
+    return merged_df.dropna(subset=KEY_COLUMNS).reset_index(drop=True)
+
+def build_index():
+    """build_chromadb_jamendo.py를 별도 프로세스로 실행합니다. (임베딩 모델은 이 단계에서만 로드)"""
+    subprocess.run([sys.executable, BUILD_SCRIPT], cwd=AI_DIR, check=True)
+
+# =========================================================
+# 4. 의존 그래프
+# =========================================================
+def build_graph(include_index: bool = BUILD_INDEX) -> dict[str, dict]:
+    """
+    단계 이름 → {deps, inputs, outputs, code, fn}
+    fn(upstream)은 앞 단계 결과 dict(이번에 실행하지 않았으면 None)를 받아 DataFrame을 반환합니다.
+    """
+    def merge_fn(upstream):
+        g = upstream["parse_genre"]
+        m = upstream["parse_mood"]
+        df = merge_tags(g if g is not None else pd.read_parquet(GENRE_PARQUET),
+                        m if m is not None else pd.read_parquet(MOOD_PARQUET))
+        df.to_parquet(MERGED_PARQUET, index=False)
+        print(f"   -> {len(df)} merged rows → {MERGED_PARQUET}")
+        return df
+
+    def clean_fn(upstream):
+        merged_df = upstream["merge"]
+        df = clean_tags(merged_df if merged_df is not None else pd.read_parquet(MERGED_PARQUET))
+        df.to_parquet(CLEANED_PARQUET, index=False)
+        df.to_csv(CLEANED_CSV, index=False, encoding="utf-8-sig") # utf-8-sig for Excel compatibility
+        print(f"   -> {len(df)} cleaned rows → {CLEANED_PARQUET}, {CLEANED_CSV}")
+        return df
+
+    def tag_matrix_fn(upstream):
+        cleaned_df = upstream["clean"]
+        tag_matrix.build_tag_matrix(cleaned_df if cleaned_df is not None else pd.read_parquet(CLEANED_PARQUET))
+
+    parse_code = [tag_etl.__file__, _typed, _parse_stage]
+    graph = {
+        "parse_genre": {
+            "deps": [], "inputs": [GENRE_TSV], "outputs": [GENRE_PARQUET], "code": parse_code,
+            "fn": lambda upstream: _parse_stage(GENRE_TSV, "genre_tags", GENRE_PARQUET)(),
+        },
+        "parse_mood": {
+            "deps": [], "inputs": [MOOD_TSV], "outputs": [MOOD_PARQUET], "code": parse_code,
+            "fn": lambda upstream: _parse_stage(MOOD_TSV, "mood_tags", MOOD_PARQUET)(),
+        },
+        "merge": {
+            "deps": ["parse_genre", "parse_mood"], "inputs": [GENRE_PARQUET, MOOD_PARQUET],
+            "outputs": [MERGED_PARQUET], "code": [_typed, merge_tags, merge_fn], "fn": merge_fn,
+        },
+        "clean": {
+            "deps": ["merge"], "inputs": [MERGED_PARQUET],
+            "outputs": [CLEANED_PARQUET, CLEANED_CSV], "code": [clean_tags, clean_fn], "fn": clean_fn,
+        },
+        "tag_matrix": {
+            "deps": ["clean"], "inputs": [CLEANED_PARQUET], "outputs": tag_matrix.output_files(),
+            "code": [tag_matrix.__file__, tag_matrix_fn], "fn": tag_matrix_fn,
+        },
+    }
+    if include_index:
+        graph["index"] = {
+            "deps": ["clean"], "inputs": [CLEANED_CSV], "outputs": INDEX_OUTPUTS,
+            "code": [BUILD_SCRIPT, os.path.join(AI_DIR, "rag", "parallel_embeddings.py"), tag_matrix.__file__],
+            "fn": lambda upstream: build_index(),
+        }
+    return graph
+
+# =========================================================
+# 5. 파이프라인 실행
+# =========================================================
+def run_pipeline(force: bool = False, include_index: bool = BUILD_INDEX) -> pd.DataFrame | None:
+    """
+    의존 그래프를 위상 순서로 실행하고, 오래된(stale) 단계만 다시 실행합니다.
+    앞 단계 결과가 메모리에 있으면 그대로 넘기고, 건너뛴 단계의 결과는 필요할 때만 Parquet에서 읽습니다.
+    반환값: 이번에 다시 만든 정제 DataFrame (clean 단계를 건너뛰었으면 None)
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    state = _load_state()
+    graph = build_graph(include_index)
+
+    results, timings = {}, []
+    order = TopologicalSorter({name: stage["deps"] for name, stage in graph.items()}).static_order()
+    for name in order:
+        stage = graph[name]
+        upstream = {dep: results.get(dep) for dep in stage["deps"]}
+        results[name], ran, elapsed = run_stage(
+            state, name, stage["inputs"], stage["outputs"],
+            lambda: stage["fn"](upstream), stage["code"], force
+        )
+        timings.append((name, "ran" if ran else "skipped", elapsed))
+
+    print("\n⏱️  Stage timings:")
+    for name, status, elapsed in timings:
+        print(f"   {name:<12} {status:<8} {elapsed:8.2f}s")
+    print(f"   {'total':<12} {'':<8} {sum(t for _, _, t in timings):8.2f}s")
+    return results.get("clean")
+
+if __name__ == "__main__":
+    missing = [p for p in (GENRE_TSV, MOOD_TSV) if not os.path.exists(p)]
+    if missing:
+        print(f"❌ 파일을 찾을 수 없습니다: {missing}")
+        exit()
+    run_pipeline()
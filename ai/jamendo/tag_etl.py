@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+tag_etl.py
+- MTG-Jamendo autotagging TSV(genre / moodtheme)를 한 번에 파싱하는 공용 ETL 모듈입니다.
+- 행 단위 iterrows / startswith 루프 대신, 청크 단위로 읽어 pandas 문자열 연산으로 처리합니다.
+  (청크 크기만큼만 메모리에 올리므로 최대 메모리 사용량이 제한됨)
+- 결과: TRACK_ID, PATH, genre_tags, mood_tags 를 한 DataFrame으로 반환합니다.
+  (태그는 기존 CSV와 같이 탭으로 구분, genre는 소문자)
+- genre.py / moodtheme.py 는 이 모듈을 사용하는 얇은 래퍼입니다.
+"""
+
+import os
+import csv
+import pandas as pd
+
+# =========================================================
+# 1. 설정
+# =========================================================
+BASE_DIR = os.path.dirname(__file__) # -> .../ai/jamendo
+MTG_DATA_DIR = os.path.join(os.path.dirname(BASE_DIR), "mtg-jamendo-dataset/data")
+GENRE_TSV = os.path.join(MTG_DATA_DIR, "autotagging_genre.tsv")
+MOOD_TSV = os.path.join(MTG_DATA_DIR, "autotagging_moodtheme.tsv")
+
+DATA_DIR = os.path.join(BASE_DIR, "data")
+GENRE_OUTPUT = os.path.join(DATA_DIR, "processed_genre_tags.csv")
+MOOD_OUTPUT = os.path.join(DATA_DIR, "processed_mood_tags.csv")
+
+CHUNK_SIZE = 20000  # 한 번에 처리할 TSV 행 수
+
+# 태그 접두사 → (출력 컬럼, 소문자 변환 여부)
+TAG_PREFIXES = {
+    "genre---": ("genre_tags", True),
+    "mood/theme---": ("mood_tags", False),
+}
+TAG_SEPARATOR = "\t"
+
+# =========================================================
+# 2. TSV 파싱 (청크 단위, 벡터화)
+# =========================================================
+def _read_header(tsv_path: str) -> tuple[int, int, int]:
+    with open(tsv_path, "r", encoding="utf-8") as f:
+        header = f.readline().rstrip("\n").split("\t")
+    for col in ("TRACK_ID", "PATH", "TAGS"):
+        if col not in header:
+            raise ValueError(f"TSV 헤더에서 '{col}' 컬럼을 찾을 수 없습니다: {tsv_path}")
+    return header.index("TRACK_ID"), header.index("PATH"), header.index("TAGS")
+
+def _chunk_tags(lines: pd.Series, track_idx: int, path_idx: int, tags_idx: int) -> pd.DataFrame:
+    """
+    원본 줄(line) 시리즈 → TRACK_ID, PATH, genre_tags, mood_tags
+    TAGS 이후의 모든 필드를 태그로 보고, 접두사별로 분류합니다.
+    """
+    fields = lines.str.split("\t", n=tags_idx, expand=True)
+    if fields.shape[1] <= tags_idx:
+        return pd.DataFrame(columns=["TRACK_ID", "PATH", *[c for c, _ in TAG_PREFIXES.values()]])
+    fields = fields.dropna(subset=[tags_idx])
+
+    base = pd.DataFrame({"TRACK_ID": fields[track_idx], "PATH": fields[path_idx]})
+    # 한 행의 여러 태그를 개별 행으로 펼친 뒤 접두사별로 골라 다시 묶음
+    tags = fields[tags_idx].str.split("\t").explode()
+    tags = tags[tags.str.len() > 0]
+
+    for prefix, (column, lower) in TAG_PREFIXES.items():
+        matched = tags[tags.str.startswith(prefix)].str.slice(len(prefix))
+        if lower:
+            matched = matched.str.lower()
+        base[column] = matched.groupby(level=0).agg(TAG_SEPARATOR.join)
+    return base
+
+def iter_tsv_chunks(tsv_path: str, chunk_size: int = CHUNK_SIZE):
+    """TSV를 chunk_size 줄씩 읽어 파싱된 DataFrame 청크를 yield 합니다."""
+    track_idx, path_idx, tags_idx = _read_header(tsv_path)
+    reader = pd.read_csv(
+        tsv_path, sep="\x01", header=None, names=["line"], skiprows=1, dtype=str,
+        quoting=csv.QUOTE_NONE, chunksize=chunk_size, encoding="utf-8", keep_default_na=False
+    )
+    for chunk in reader:
+        yield _chunk_tags(chunk["line"], track_idx, path_idx, tags_idx)
+
+def parse_autotagging(tsv_paths: list[str], chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """
+    여러 autotagging TSV를 한 번씩만 읽어 트랙별 genre_tags / mood_tags 를 함께 반환합니다.
+    (같은 트랙이 여러 파일에 있으면 태그 컬럼을 합침, PATH는 처음 값 사용)
+    """
+    parts = []
+    for tsv_path in tsv_paths:
+        print(f"🔄 Parsing: {tsv_path}")
+        for chunk in iter_tsv_chunks(tsv_path, chunk_size):
+            parts.append(chunk)
+    if not parts:
+        return pd.DataFrame(columns=["TRACK_ID", "PATH", "genre_tags", "mood_tags"])
+
+    df = pd.concat(parts, ignore_index=True)
+    # 트랙별로 첫 번째 non-null 값 (파일마다 채워진 태그 컬럼이 다름)
+    df = df.groupby("TRACK_ID", sort=False).first().reset_index()
+    return df[["TRACK_ID", "PATH", "genre_tags", "mood_tags"]]
+
+def save_processed(df: pd.DataFrame, genre_path: str = GENRE_OUTPUT, mood_path: str = MOOD_OUTPUT):
+    """genre.py / moodtheme.py 와 같은 형식의 processed_*_tags.csv 두 개를 저장합니다."""
+    os.makedirs(os.path.dirname(genre_path), exist_ok=True)
+    genre_df = df.loc[df["genre_tags"].notna(), ["TRACK_ID", "PATH", "genre_tags"]]
+    mood_df = df.loc[df["mood_tags"].notna(), ["TRACK_ID", "PATH", "mood_tags"]]
+    genre_df.to_csv(genre_path, index=False, encoding="utf-8")
+    mood_df.to_csv(mood_path, index=False, encoding="utf-8")
+    print(f"   -> genre: {len(genre_df)} tracks → {genre_path}")
+    print(f"   -> mood : {len(mood_df)} tracks → {mood_path}")
+
+# =========================================================
+# 3. 메인 실행
+# =========================================================
+if __name__ == "__main__":
+    missing = [p for p in (GENRE_TSV, MOOD_TSV) if not os.path.exists(p)]
+    if missing:
+        print(f"❌ 파일을 찾을 수 없습니다: {missing}")
+        exit()
+
+    tags_df = parse_autotagging([GENRE_TSV, MOOD_TSV])
+    print(f"✅ {len(tags_df)}개 트랙 태그 파싱 완료.")
+    print(tags_df.head())
+    save_processed(tags_df)
@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+tag_matrix.py
+- 정제된 태그(cleaned_merged_tags)를 태그 사전(vocabulary) + 곡별 multi-hot 비트 행렬로 저장합니다.
+  - vocab.json       : {"genre": [...], "mood": [...]} (정렬된 태그 목록, 열 순서)
+  - track_ids.json   : 행 순서의 TRACK_ID 목록
+  - {genre,mood}_bits.npy : (곡 수, ceil(태그 수/8)) uint8, np.packbits로 압축된 행 = 곡
+- TagMatrix.load()는 비트 행렬을 memory-map으로 열어, 소비하는 쪽에서 탭 구분 문자열을
+  매번 다시 split하지 않고 태그 겹침 점수 / 필터 / 패싯 개수를 벡터 연산 한 번으로 구합니다.
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+
+from tag_etl import DATA_DIR, TAG_SEPARATOR
+
+# =========================================================
+# 1. 설정
+# =========================================================
+TAG_MATRIX_DIR = os.path.join(DATA_DIR, "tag_matrix")
+VOCAB_FILE = "vocab.json"
+TRACK_IDS_FILE = "track_ids.json"
+BITS_FILE = "{field}_bits.npy"
+FIELDS = {"genre": "genre_tags", "mood": "mood_tags"}  # 필드 이름 → DataFrame 컬럼
+
+# 0~255 각 바이트의 1 비트 수 (packbits 행렬에서 바로 popcount)
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint8)
+
+# =========================================================
+# 2. 생성 (ETL 단계)
+# =========================================================
+def encode_multi_hot(tags: pd.Series) -> tuple[list[str], np.ndarray]:
+    """탭 구분 태그 시리즈 → (정렬된 태그 목록, (N, ceil(T/8)) packbits 행렬). 태그 없는 행은 모두 0."""
+    dummies = tags.astype("string").fillna("").str.get_dummies(sep=TAG_SEPARATOR)
+    # 빈 값/빈 조각("")은 태그가 아님 (get_dummies는 이를 "" 열로 만듦)
+    dummies = dummies.drop(columns=[""], errors="ignore")
+    vocab = [str(tag) for tag in dummies.columns]
+    bits = np.packbits(dummies.to_numpy(dtype=bool), axis=1)
+    return vocab, bits
+
+def encode_tags(df: pd.DataFrame) -> tuple[dict[str, list[str]], dict[str, np.ndarray]]:
+    """정제된 태그 DataFrame → 필드별 (태그 목록, packbits 행렬)"""
+    vocabs, bits = {}, {}
+    for field, column in FIELDS.items():
+        vocabs[field], bits[field] = encode_multi_hot(df[column])
+    return vocabs, bits
+
+def build_tag_matrix(df: pd.DataFrame, out_dir: str = TAG_MATRIX_DIR):
+    """정제된 태그 DataFrame(TRACK_ID, genre_tags, mood_tags)으로 태그 행렬 파일들을 만듭니다."""
+    os.makedirs(out_dir, exist_ok=True)
+    vocabs, bits = encode_tags(df)
+    for field in FIELDS:
+        np.save(os.path.join(out_dir, BITS_FILE.format(field=field)), bits[field])
+        print(f"   -> {field}: {len(vocabs[field])} tags, {bits[field].nbytes / 1e3:.1f} KB packed")
+
+    with open(os.path.join(out_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+        json.dump(vocabs, f, ensure_ascii=False)
+    with open(os.path.join(out_dir, TRACK_IDS_FILE), "w", encoding="utf-8") as f:
+        json.dump(df["TRACK_ID"].astype(str).tolist(), f)
+
+def output_files(out_dir: str = TAG_MATRIX_DIR) -> list[str]:
+    """build_tag_matrix()가 만드는 파일 목록 (pipeline.py의 단계 출력)"""
+    return [os.path.join(out_dir, name) for name in
+            (VOCAB_FILE, TRACK_IDS_FILE, *[BITS_FILE.format(field=f) for f in FIELDS])]
+
+# =========================================================
+# 3. 로드 / 질의
+# =========================================================
+class TagMatrix:
+    """
+    곡 × 태그 multi-hot 비트 행렬 (필드별: genre, mood).
+
+    Args:
+        track_ids (list[str]): 행 순서의 TRACK_ID
+        vocabs (dict[str, list[str]]): 필드 → 태그 목록 (비트 열 순서)
+        bits (dict[str, np.ndarray]): 필드 → (N, ceil(T/8)) uint8 packbits 행렬
+    """
+    def __init__(self, track_ids: list[str], vocabs: dict[str, list[str]], bits: dict[str, np.ndarray]):
+        self.track_ids = track_ids
+        self.vocabs = vocabs
+        self.bits = bits
+        self.tag_ids = {field: {tag: i for i, tag in enumerate(vocab)} for field, vocab in vocabs.items()}
+
+    @classmethod
+    def load(cls, index_dir: str = TAG_MATRIX_DIR, mmap: bool = True) -> "TagMatrix":
+        with open(os.path.join(index_dir, VOCAB_FILE), "r", encoding="utf-8") as f:
+            vocabs = json.load(f)
+        with open(os.path.join(index_dir, TRACK_IDS_FILE), "r", encoding="utf-8") as f:
+            track_ids = json.load(f)
+        bits = {field: np.load(os.path.join(index_dir, BITS_FILE.format(field=field)),
+                               mmap_mode="r" if mmap else None)
+                for field in vocabs}
+        return cls(track_ids, vocabs, bits)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TagMatrix":
+        """파일을 거치지 않고 DataFrame에서 바로 만든 (메모리 상의) 태그 행렬"""
+        vocabs, bits = encode_tags(df)
+        return cls(df["TRACK_ID"].astype(str).tolist(), vocabs, bits)
+
+    def __len__(self) -> int:
+        return len(self.track_ids)
+
+    def row_positions(self, track_ids: list[str]) -> np.ndarray:
+        """track_ids 각각의 행 번호 (N',). 행렬에 없는 곡은 -1."""
+        rows = {track_id: i for i, track_id in enumerate(self.track_ids)}
+        return np.fromiter((rows.get(str(t), -1) for t in track_ids), dtype=np.int64, count=len(track_ids))
+
+    def tag_bitmaps(self, field: str, track_ids: list[str]) -> np.ndarray:
+        """
+        태그 → 곡 bitmap (T, ceil(N'/8)). 곡 축은 주어진 track_ids 순서를 따릅니다.
+        (rag_retriever의 태그 역색인용: 임베딩 행 순서에 맞춰 재배열, 없는 곡은 태그 없음)
+        """
+        positions = self.row_positions(track_ids)
+        found = positions >= 0
+        dense = np.zeros((len(track_ids), len(self.vocabs[field])), dtype=bool)
+        dense[found] = np.unpackbits(self.bits[field][positions[found]], axis=1,
+                                     count=len(self.vocabs[field])).astype(bool)
+        return np.packbits(dense.T, axis=1)
+
+    def query_bits(self, field: str, tags: list[str]) -> np.ndarray:
+        """태그 목록 → 행렬과 같은 폭의 packbits 쿼리 벡터. (사전에 없는 태그는 무시)"""
+        dense = np.zeros(len(self.vocabs[field]), dtype=bool)
+        for tag in tags:
+            i = self.tag_ids[field].get(tag)
+            if i is not None:
+                dense[i] = True
+        return np.packbits(dense)
+
+    def overlap(self, field: str, tags: list[str]) -> np.ndarray:
+        """곡마다 주어진 태그 중 몇 개를 가졌는지 (N,) 개수를 반환합니다."""
+        q = self.query_bits(field, tags)
+        return _POPCOUNT[self.bits[field] & q].sum(axis=1, dtype=np.int32)
+
+    def mask(self, all_of: dict[str, list[str]] | None = None,
+             any_of: dict[str, list[str]] | None = None,
+             none_of: dict[str, list[str]] | None = None) -> np.ndarray:
+        """
+        필드별 태그 조건을 만족하는 곡의 bool mask (N,)
+        - all_of : 나열한 태그를 *모두* 가진 곡 (사전에 없는 태그가 있으면 결과 없음)
+        - any_of : 나열한 태그 중 *하나 이상* 가진 곡
+        - none_of: 나열한 태그를 *하나도* 갖지 않은 곡
+        예) mask(all_of={"genre": ["rock"]}, none_of={"mood": ["sad"]})
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for field, tags in (all_of or {}).items():
+            if any(tag not in self.tag_ids[field] for tag in tags):
+                return np.zeros(len(self), dtype=bool)
+            mask &= self.overlap(field, tags) == len(set(tags))
+        for field, tags in (any_of or {}).items():
+            mask &= self.overlap(field, tags) > 0
+        for field, tags in (none_of or {}).items():
+            mask &= self.overlap(field, tags) == 0
+        return mask
+
+    def facet_counts(self, field: str, mask: np.ndarray | None = None) -> dict[str, int]:
+        """(mask로 고른) 곡들에서 태그별 곡 수를 셉니다. 개수 내림차순."""
+        bits = self.bits[field] if mask is None else self.bits[field][mask]
+        counts = np.unpackbits(bits, axis=1, count=len(self.vocabs[field])).sum(axis=0, dtype=np.int64)
+        order = np.argsort(-counts, kind="stable")
+        return {self.vocabs[field][i]: int(counts[i]) for i in order if counts[i] > 0}
+
+# =========================================================
+# 4. 메인 실행
+# =========================================================
+if __name__ == "__main__":
+    from pipeline import CLEANED_PARQUET
+    if not os.path.exists(CLEANED_PARQUET):
+        print(f"❌ 파일을 찾을 수 없습니다: {CLEANED_PARQUET} (pipeline.py를 먼저 실행하세요)")
+        exit()
+    build_tag_matrix(pd.read_parquet(CLEANED_PARQUET))
+    matrix = TagMatrix.load()
+    print(f"✅ {len(matrix)}개 트랙 태그 행렬 저장 완료: {TAG_MATRIX_DIR}")
+    print(list(matrix.facet_counts("genre").items())[:10])
@@ -1,20 +1,10 @@
-import requests
-import json
+# 공유 Ollama 클라이언트(agents/ollama_api.py)를 통해 호출합니다. (keep-alive 세션 재사용)
+try:
+    from ollama_api import generate_stream
+except ImportError:
+    from agents.ollama_api import generate_stream
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
 MODEL_NAME = "gemma:2b"  # 예: Ollama에서 설치한 모델 이름
 
 def query_ollama(prompt: str) -> str:
-    payload = {"model": MODEL_NAME, "prompt": prompt}
-    response = requests.post(OLLAMA_URL, json=payload, stream=True)
-
-    output = ""
-    for line in response.iter_lines():
-        if line:
-            try:
-                data = json.loads(line)
-                if "response" in data:
-                    output += data["response"]
-            except:
-                pass
-    return output.strip()
+    return generate_stream(MODEL_NAME, prompt)
@@ -5,9 +5,16 @@ build_chroma_db.py
 - 'genre_tags'와 'mood_tags'를 결합하여 임베딩할 텍스트(page_content)를 만듭니다.
 - 'TRACK_ID', 'PATH' 등은 메타데이터(metadata)로 저장합니다.
 - LangChain과 ChromaDB를 사용하여 벡터 DB를 구축하고 디스크에 저장합니다.
+- (기본) 스트리밍 빌드: CSV를 청크 단위로 읽어 임베딩 → upsert 하고,
+  체크포인트를 남겨 중단된 빌드를 이어서 진행할 수 있습니다.
 """
 
 import os
+import sys
+import json
+import time
+import hashlib
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from langchain_community.vectorstores import Chroma
@@ -25,6 +32,22 @@ DB_PERSIST_DIR = "rag/chroma_db"
 COLLECTION_NAME = "jamendo_songs"
 # Agent 3의 키워드와 동일한 임베딩 모델 사용 (매우 중요)
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+# rag_retriever의 NumPy 백엔드가 읽는 인덱스 폴더 (embeddings.npy + metadata.json)
+NUMPY_INDEX_DIR = "rag/numpy_index"
+
+# 스트리밍 빌드 설정
+STREAMING_BUILD = True      # False이면 기존 방식(전체 Document 리스트 → from_documents)
+CSV_CHUNK_SIZE = 2000       # 한 번에 읽어 upsert할 행 수 (= 체크포인트 단위)
+EMBED_BATCH_SIZE = 256      # 임베딩 모델 배치 크기
+CHECKPOINT_FILE = "build_checkpoint.json"  # DB 폴더 안에 저장
+
+# 멀티 프로세스 임베딩 (CPU 전용 빌드 서버용)
+EMBED_WORKERS = 0               # 0 또는 1이면 현재 프로세스에서 임베딩, 2 이상이면 프로세스 풀
+EMBED_THREADS_PER_WORKER = 1    # 워커당 torch 스레드 수 (워커 수 × 스레드 수 ≈ 코어 수)
+
+# 증분 빌드: track_id별 내용 해시를 기록해 두고 바뀐/새 곡만 다시 임베딩
+INCREMENTAL_BUILD = True
+MANIFEST_FILE = "content_hashes.json"      # DB 폴더 안에 저장 {"embedder": {...}, "hashes": {track_id: hash}}
 
 # =========================================================
 # 2. 데이터 로드 및 LangChain Document로 변환
@@ -69,18 +92,15 @@ def load_and_prepare_documents(csv_path: str) -> list[Document]:
 # =========================================================
 # 3. 임베딩 모델 로드
 # =========================================================
-from langchain_huggingface import HuggingFaceEmbeddings
+from parallel_embeddings import ParallelEmbeddings, embedder_settings, load_embedding_model as _load_embedding_model
+
+# 태그 사전/곡별 태그 인코딩은 Jamendo ETL(jamendo/tag_matrix.py)과 공유
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jamendo"))
+from tag_matrix import TagMatrix
 
 def load_embedding_model(model_name: str):
-    """HuggingFace 임베딩 모델을 LangChain 형식으로 로드합니다."""
-    print(f"🚀 Loading embedding model ({model_name})...")
-    # device='auto'로 설정하여 GPU가 있으면 자동으로 사용
-    embeddings = HuggingFaceEmbeddings(
-        model_name=model_name,
-        encode_kwargs={'normalize_embeddings': True} # 코사인 유사도를 위해 정규화
-    )
-    print("   -> Model loaded.")
-    return embeddings
+    """HuggingFace 임베딩 모델을 LangChain 형식으로 로드합니다. (EMBED_WORKERS > 1이면 프로세스 풀)"""
+    return _load_embedding_model(model_name, EMBED_WORKERS, EMBED_BATCH_SIZE, EMBED_THREADS_PER_WORKER)
 
 # =========================================================
 # 4. ChromaDB 생성 및 저장
@@ -111,22 +131,354 @@ def build_and_persist_db(documents: list[Document], embeddings, db_path: str, co
     vector_db.persist()
     print(f"\n✅ ChromaDB built and saved successfully!")
     print(f"   -> Total vectors in collection '{collection_name}': {vector_db._collection.count()}")
+    return vector_db
+
+# =========================================================
+# 4-1. 스트리밍 빌드 (청크 단위 임베딩 + upsert, 체크포인트로 이어하기)
+# =========================================================
+def _input_fingerprint(csv_path: str) -> dict:
+    stat = os.stat(csv_path)
+    return {"input": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+def _load_checkpoint(path: str, fingerprint: dict) -> int:
+    """같은 입력 파일에 대한 체크포인트가 있으면 완료된 행 수를, 없으면 0을 반환합니다."""
+    if not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            ckpt = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return 0
+    if any(ckpt.get(k) != v for k, v in fingerprint.items()):
+        print("⚠️ Checkpoint belongs to a different input file. Starting over.")
+        return 0
+    return int(ckpt.get("rows_done", 0))
+
+def _save_checkpoint(path: str, fingerprint: dict, rows_done: int):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({**fingerprint, "rows_done": rows_done}, f)
+    os.replace(tmp_path, path) # 원자적 교체 (쓰는 중 중단되어도 이전 체크포인트 유지)
+
+def chunk_to_records(df: pd.DataFrame) -> tuple[list[str], list[str], list[dict]]:
+    """DataFrame 청크를 (ids, page_contents, metadatas)로 변환합니다. (iterrows 없이 열 단위 연산)"""
+    df = df.fillna('')
+    contents = ("Genre: " + df['genre_tags'].astype(str) + ". Mood: " + df['mood_tags'].astype(str)).str.strip()
+    metadatas = df[['TRACK_ID', 'PATH', 'genre_tags', 'mood_tags']].rename(
+        columns={'TRACK_ID': 'track_id', 'PATH': 'path'}
+    ).to_dict("records")
+    return df['TRACK_ID'].astype(str).tolist(), contents.tolist(), metadatas
+
+def embed_deduplicated(embeddings, contents: list[str], memo: dict | None = None) -> list[list[float]]:
+    """
+    같은 page_content("Genre: ... Mood: ...")는 한 번만 임베딩하고 벡터를 공유합니다.
+    memo를 넘기면 청크를 넘어 빌드 전체에서 재사용합니다. (태그 조합이 제한적이라 중복이 많음)
+    """
+    memo = {} if memo is None else memo
+    missing = list(dict.fromkeys(c for c in contents if c not in memo))
+    if missing:
+        for content, vector in zip(missing, embeddings.embed_documents(missing)):
+            memo[content] = vector
+    return [memo[c] for c in contents]
+
+def prefetch_embeddings(embeddings, csv_path: str, chunk_size: int = CSV_CHUNK_SIZE,
+                        rows_done: int = 0, old_manifest: dict[str, str] | None = None) -> dict:
+    """
+    남은 행(old_manifest가 있으면 바뀐 곡만)의 고유 page_content를 모아 한 번의 호출로 임베딩하고
+    page_content → 벡터 memo를 반환합니다.
+    ParallelEmbeddings는 청크마다 호출하면 워커 대부분이 놀고 청크마다 모든 워커를 기다리므로,
+    전체를 한 번에 넘겨 워커 수만큼 고르게 나눠지도록 합니다.
+    """
+    contents = {}  # 순서 있는 집합
+    reader = pd.read_csv(csv_path, chunksize=chunk_size,
+                         skiprows=range(1, rows_done + 1) if rows_done else None)
+    for chunk in reader:
+        ids, texts, metadatas = chunk_to_records(chunk)
+        for track_id, text, metadata in zip(ids, texts, metadatas):
+            if old_manifest is None or old_manifest.get(track_id) != content_hash(text, metadata):
+                contents.setdefault(text)
+
+    print(f"🧮 Embedding {len(contents)} unique contents in one pass ({embeddings.workers} workers)...")
+    started = time.perf_counter()
+    memo = {}
+    embed_deduplicated(embeddings, list(contents), memo)
+    print(f"   -> done in {time.perf_counter() - started:.1f}s")
+    return memo
+
+def build_db_streaming(csv_path: str, embeddings, db_path: str, collection_name: str,
+                       chunk_size: int = CSV_CHUNK_SIZE, resume: bool = True):
+    """
+    CSV를 chunk_size 행씩 읽어 임베딩하고 컬렉션에 upsert 합니다.
+    - 문서 ID = TRACK_ID (같은 청크를 다시 처리해도 중복되지 않음)
+    - 청크마다 체크포인트(완료된 행 수)를 저장 → 중단 후 재실행 시 이어서 진행
+    - 메모리 사용량은 전체 코퍼스가 아니라 청크 크기에 비례
+    """
+    if not os.path.exists(csv_path):
+        print(f"❌ Input file not found: {csv_path}")
+        return None
+
+    os.makedirs(db_path, exist_ok=True)
+    ckpt_path = os.path.join(db_path, CHECKPOINT_FILE)
+    fingerprint = _input_fingerprint(csv_path)
+    rows_done = _load_checkpoint(ckpt_path, fingerprint) if resume else 0
+
+    vector_db = Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=db_path
+    )
+    if rows_done:
+        print(f"⏩ Resuming build from row {rows_done}.")
+    else:
+        # 새로 빌드: 이전 내용 해시를 먼저 지운 뒤 컬렉션을 비움
+        # (첫 체크포인트 전에 중단되어도 다음 증분 빌드가 빈 컬렉션을 "변경 없음"으로 보지 않도록)
+        manifest_path = os.path.join(db_path, MANIFEST_FILE)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        vector_db.delete_collection()
+        vector_db = Chroma(
+            collection_name=collection_name,
+            embedding_function=embeddings,
+            persist_directory=db_path
+        )
+
+    print(f"🛠️  Streaming build into '{collection_name}' (chunk={chunk_size}, batch={EMBED_BATCH_SIZE})...")
+    started = time.perf_counter()
+    processed = 0
+    memo = {}  # page_content → 벡터 (중복 내용은 한 번만 임베딩)
+    if isinstance(embeddings, ParallelEmbeddings):
+        memo = prefetch_embeddings(embeddings, csv_path, chunk_size, rows_done)
+    reader = pd.read_csv(csv_path, chunksize=chunk_size,
+                         skiprows=range(1, rows_done + 1) if rows_done else None)
+    for chunk in reader:
+        ids, contents, metadatas = chunk_to_records(chunk)
+        vectors = embed_deduplicated(embeddings, contents, memo)
+        vector_db._collection.upsert(ids=ids, embeddings=vectors, metadatas=metadatas, documents=contents)
+
+        rows_done += len(chunk)
+        processed += len(chunk)
+        _save_checkpoint(ckpt_path, fingerprint, rows_done)
+        elapsed = time.perf_counter() - started
+        print(f"   -> {rows_done} rows done ({processed / max(elapsed, 1e-9):.1f} docs/sec, "
+              f"{len(memo)} unique contents embedded)")
+
+    if os.path.exists(ckpt_path): # 행이 없는 CSV면 체크포인트가 만들어지지 않음
+        os.remove(ckpt_path) # 완료되면 체크포인트 제거 (다음 실행은 새 빌드)
+    # 다음 실행부터 증분 빌드가 가능하도록 내용 해시 기록
+    _save_manifest(os.path.join(db_path, MANIFEST_FILE), compute_manifest(csv_path, chunk_size),
+                   embedder_settings(EMBED_MODEL_NAME))
+    print(f"\n✅ ChromaDB built and saved successfully!")
+    print(f"   -> Total vectors in collection '{collection_name}': {vector_db._collection.count()}")
+    return vector_db
 
 # =========================================================
-# 5. 메인 실행
+# 4-2. 증분 빌드 (바뀐/새 곡만 임베딩, 삭제된 곡은 제거)
+# =========================================================
+def content_hash(content: str, metadata: dict) -> str:
+    """임베딩 텍스트 + 메타데이터의 해시. 둘 중 하나라도 바뀌면 다시 upsert 합니다."""
+    payload = json.dumps([content, metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def compute_manifest(csv_path: str, chunk_size: int = CSV_CHUNK_SIZE) -> dict[str, str]:
+    """CSV 전체의 {track_id: 내용 해시}를 계산합니다. (임베딩 없음)"""
+    manifest = {}
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        ids, contents, metadatas = chunk_to_records(chunk)
+        for track_id, content, metadata in zip(ids, contents, metadatas):
+            manifest[track_id] = content_hash(content, metadata)
+    return manifest
+
+def _load_manifest(path: str, embedder: dict) -> dict[str, str] | None:
+    """
+    이전 빌드의 {track_id: 내용 해시}. 기록이 없거나, 임베딩 모델/설정(embedder)이
+    지금과 다르면 None (= 전체 다시 임베딩)
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    stored = data.get("embedder") if isinstance(data, dict) else None
+    if stored != embedder or "hashes" not in data:
+        print(f"ℹ️  Embedding model/settings changed since last build ({stored} → {embedder}).")
+        return None
+    return data["hashes"]
+
+def _save_manifest(path: str, manifest: dict[str, str], embedder: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"embedder": embedder, "hashes": manifest}, f)
+    os.replace(tmp_path, path)
+
+def build_db_incremental(csv_path: str, embeddings, db_path: str, collection_name: str,
+                         chunk_size: int = CSV_CHUNK_SIZE):
+    """
+    이전 빌드의 내용 해시(MANIFEST_FILE)와 비교하여
+    - 새 곡/바뀐 곡만 임베딩하여 upsert
+    - CSV에서 사라진 곡은 컬렉션에서 삭제
+    합니다. 해시 기록이 없거나 중단된 빌드가 있으면 스트리밍 전체 빌드로 대체합니다.
+    """
+    if not os.path.exists(csv_path):
+        print(f"❌ Input file not found: {csv_path}")
+        return None
+
+    manifest_path = os.path.join(db_path, MANIFEST_FILE)
+    embedder = embedder_settings(EMBED_MODEL_NAME)
+    old_manifest = _load_manifest(manifest_path, embedder)
+    if old_manifest is None or os.path.exists(os.path.join(db_path, CHECKPOINT_FILE)):
+        print("ℹ️  No usable previous build manifest (or unfinished build). Running full streaming build.")
+        return build_db_streaming(csv_path, embeddings, db_path, collection_name, chunk_size)
+
+    vector_db = Chroma(
+        collection_name=collection_name,
+        embedding_function=embeddings,
+        persist_directory=db_path
+    )
+
+    started = time.perf_counter()
+    new_manifest = {}
+    changed = 0
+    memo = {}
+    if isinstance(embeddings, ParallelEmbeddings):
+        memo = prefetch_embeddings(embeddings, csv_path, chunk_size, old_manifest=old_manifest)
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_size):
+        ids, contents, metadatas = chunk_to_records(chunk)
+        hashes = [content_hash(c, m) for c, m in zip(contents, metadatas)]
+        keep = [i for i, (track_id, h) in enumerate(zip(ids, hashes)) if old_manifest.get(track_id) != h]
+        new_manifest.update(zip(ids, hashes))
+        if not keep:
+            continue
+        texts = [contents[i] for i in keep]
+        vector_db._collection.upsert(
+            ids=[ids[i] for i in keep],
+            embeddings=embed_deduplicated(embeddings, texts, memo),
+            metadatas=[metadatas[i] for i in keep],
+            documents=texts
+        )
+        changed += len(keep)
+
+    removed = [track_id for track_id in old_manifest if track_id not in new_manifest]
+    for start in range(0, len(removed), chunk_size):
+        vector_db._collection.delete(ids=removed[start:start + chunk_size])
+
+    _save_manifest(manifest_path, new_manifest, embedder)
+    elapsed = time.perf_counter() - started
+    print(f"✅ Incremental build done in {elapsed:.1f}s: {changed} upserted, {len(removed)} deleted, "
+          f"{len(new_manifest) - changed} unchanged.")
+    print(f"   -> Total vectors in collection '{collection_name}': {vector_db._collection.count()}")
+    return vector_db
+
+# =========================================================
+# 5. NumPy 인덱스 내보내기 (rag_retriever의 "numpy" 백엔드용)
+# =========================================================
+METADATA_FIELDS = ["track_id", "path", "genre_tags", "mood_tags"]
+
+def export_numpy_index(vector_db, out_dir: str, dtype: str = "float32", page_size: int = 5000):
+    """
+    Chroma 컬렉션의 임베딩과 메타데이터를 NumPy 인덱스로 내보냅니다.
+    - embeddings.npy : (N, D) 정규화된 임베딩 (float32/float16)
+    - metadata.json  : 열 단위 메타데이터 (행 순서 = embeddings.npy 행 순서)
+    """
+    collection = vector_db._collection
+    total = collection.count()
+    print(f"📦 Exporting {total} vectors to NumPy index: {out_dir}")
+
+    vectors = []
+    columns = {field: [] for field in METADATA_FIELDS}
+    for offset in range(0, total, page_size):
+        page = collection.get(include=["embeddings", "metadatas"], limit=page_size, offset=offset)
+        vectors.append(np.asarray(page["embeddings"], dtype=np.float32))
+        for meta in page["metadatas"]:
+            for field in METADATA_FIELDS:
+                columns[field].append(meta.get(field, ""))
+
+    matrix = np.concatenate(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+    # 정규화 보장 (내적 = 코사인 유사도)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix = matrix / np.maximum(norms, 1e-12)
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "embeddings.npy"), matrix.astype(dtype))
+    export_quantized_vectors(matrix, out_dir)
+    with open(os.path.join(out_dir, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(columns, f, ensure_ascii=False)
+    print(f"   -> Saved {matrix.shape} {dtype} matrix + metadata.")
+
+    # 태그 역색인도 같은 행 순서로 함께 생성
+    export_tag_index(columns["track_id"], out_dir)
+
+def export_quantized_vectors(matrix: np.ndarray, out_dir: str):
+    """
+    검색 워커 메모리 절감용 압축 저장본을 함께 내보냅니다. (rescoring은 float32 원본 사용)
+    - embeddings_int8.npy + scales_int8.npy : 행별 스케일 int8 스칼라 양자화 (약 1/4 크기)
+    - embeddings_float16.npy                : float16 (1/2 크기)
+    """
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12)
+    codes = np.clip(np.round(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    np.save(os.path.join(out_dir, "embeddings_int8.npy"), codes)
+    np.save(os.path.join(out_dir, "scales_int8.npy"), scales.astype(np.float32))
+    np.save(os.path.join(out_dir, "embeddings_float16.npy"), matrix.astype(np.float16))
+    print(f"   -> Saved int8 ({codes.nbytes / 1e6:.1f} MB) and float16 ({matrix.size * 2 / 1e6:.1f} MB) copies.")
+
+def export_tag_index(track_ids: list[str], out_dir: str):
+    """
+    장르/무드 태그 → 곡 행 bitmap 역색인(tag_index.npz)을 생성합니다.
+    (rag_retriever의 must_have_genres / exclude_moods 사전 필터와 BM25 검색용)
+    태그 사전과 곡별 태그는 Jamendo ETL의 태그 행렬 인코딩(jamendo/tag_matrix.py)으로 만들고,
+    곡 축만 track_id로 embeddings.npy 행 순서에 맞춰 재배열합니다.
+    임베딩한 INPUT_CSV에서 매번 다시 만듭니다. (몇 초 이내. 저장된 행렬 파일이 CSV보다 오래되어
+    태그가 어긋나는 일이 없도록)
+    - {genre,mood}_vocab : ETL 태그 사전 (정렬됨)
+    - {genre,mood}_bits  : (태그 수, ceil(N/8)) np.packbits bitmap
+    """
+    matrix = TagMatrix.from_frame(pd.read_csv(INPUT_CSV, dtype=str))
+    missing = int((matrix.row_positions(track_ids) < 0).sum())
+    if missing:
+        print(f"⚠️  {missing} indexed tracks are not in the tag matrix (no tags).")
+
+    arrays = {"n": np.asarray(len(track_ids))}
+    for field in ("genre", "mood"):
+        arrays[f"{field}_vocab"] = np.asarray(matrix.vocabs[field], dtype=str)
+        arrays[f"{field}_bits"] = matrix.tag_bitmaps(field, track_ids)
+        print(f"   -> {field} tag index: {len(matrix.vocabs[field])} tags")
+
+    np.savez_compressed(os.path.join(out_dir, "tag_index.npz"), **arrays)
+
+# =========================================================
+# 6. 메인 실행
 # =========================================================
 if __name__ == "__main__":
-    # 1. 데이터 준비
-    docs = load_and_prepare_documents(INPUT_CSV)
-    
-    if docs:
-        # 2. 임베딩 모델 로드
+    if STREAMING_BUILD:
+        # 스트리밍 빌드 (청크 단위, 중단 시 이어하기)
         embedding_function = load_embedding_model(EMBED_MODEL_NAME)
-        
-        # 3. DB 구축 및 저장
-        build_and_persist_db(
-            documents=docs,
-            embeddings=embedding_function,
-            db_path=DB_PERSIST_DIR,
-            collection_name=COLLECTION_NAME
-        )
\ No newline at end of file
+        if INCREMENTAL_BUILD:
+            # 이전 빌드 대비 바뀐 곡만 처리 (처음이면 전체 빌드)
+            vector_db = build_db_incremental(INPUT_CSV, embedding_function, DB_PERSIST_DIR, COLLECTION_NAME)
+        else:
+            vector_db = build_db_streaming(INPUT_CSV, embedding_function, DB_PERSIST_DIR, COLLECTION_NAME)
+        if vector_db is not None:
+            export_numpy_index(vector_db, NUMPY_INDEX_DIR)
+        if isinstance(embedding_function, ParallelEmbeddings):
+            embedding_function.close()
+    else:
+        # 1. 데이터 준비
+        docs = load_and_prepare_documents(INPUT_CSV)
+
+        if docs:
+            # 2. 임베딩 모델 로드
+            embedding_function = load_embedding_model(EMBED_MODEL_NAME)
+
+            # 3. DB 구축 및 저장
+            vector_db = build_and_persist_db(
+                documents=docs,
+                embeddings=embedding_function,
+                db_path=DB_PERSIST_DIR,
+                collection_name=COLLECTION_NAME
+            )
+
+            # 4. NumPy 인덱스 내보내기
+            if vector_db is not None:
+                export_numpy_index(vector_db, NUMPY_INDEX_DIR)
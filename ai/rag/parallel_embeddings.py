@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+parallel_embeddings.py
+- 인덱스 빌드 스크립트(build_chromadb_jamendo.py, spotify/build_chromadb_spotify.py)가
+  함께 쓰는 임베딩 모델 로더입니다.
+- workers가 2 이상이면 spawn 프로세스 풀(워커당 모델 1개)에서 샤드 단위로 임베딩합니다.
+- 현재 프로세스/워커 모두 같은 encode_kwargs(정규화 + 배치 크기)를 사용합니다.
+"""
+
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from langchain_huggingface import HuggingFaceEmbeddings
+
+MIN_SHARD_SIZE = 32  # 샤드가 이보다 작으면 프로세스 간 전달 비용이 더 큼
+
+def _encode_kwargs(batch_size: int) -> dict:
+    return {'normalize_embeddings': True, # 코사인 유사도를 위해 정규화
+            'batch_size': batch_size}
+
+def embedder_settings(model_name: str) -> dict:
+    """
+    벡터 값에 영향을 주는 임베딩 설정 (모델 이름 + encode 옵션, 배치 크기 제외).
+    증분 빌드 manifest에 기록하여, 바뀌면 전체를 다시 임베딩합니다.
+    """
+    settings = {"model": model_name, **_encode_kwargs(0)}
+    settings.pop("batch_size")
+    return settings
+
+_worker_embeddings = None
+
+def _init_embed_worker(model_name: str, batch_size: int, num_threads: int):
+    """프로세스 풀 워커 초기화: 워커마다 모델을 한 번 로드합니다."""
+    global _worker_embeddings
+    import torch
+    torch.set_num_threads(num_threads)
+    _worker_embeddings = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs=_encode_kwargs(batch_size))
+
+def _embed_shard(texts: list[str]) -> list[list[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+class ParallelEmbeddings:
+    """
+    embed_documents 입력을 연속된 샤드로 나눠 프로세스 풀(워커당 모델 1개)에서 임베딩합니다.
+    샤드 결과는 입력 순서대로 이어 붙이므로 결과는 항상 결정적입니다.
+    LangChain Embeddings와 같은 인터페이스(embed_documents / embed_query)를 제공합니다.
+    (워커가 모두 바쁘도록 호출부는 가능한 한 큰 입력을 한 번에 넘기는 것이 좋습니다)
+    """
+    def __init__(self, model_name: str, workers: int, batch_size: int, threads_per_worker: int = 1):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=mp.get_context("spawn"), # torch와 fork는 함께 쓰지 않음
+            initializer=_init_embed_worker,
+            initargs=(model_name, batch_size, threads_per_worker)
+        )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        # 워커 수만큼 고르게 나눔 (너무 작은 샤드만 방지)
+        shard_size = max(MIN_SHARD_SIZE, -(-len(texts) // self.workers))
+        shards = [texts[i:i + shard_size] for i in range(0, len(texts), shard_size)]
+        vectors = []
+        for shard_vectors in self._pool.map(_embed_shard, shards): # map은 입력 순서 유지
+            vectors.extend(shard_vectors)
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def close(self):
+        self._pool.shutdown()
+
+def load_embedding_model(model_name: str, workers: int = 0, batch_size: int = 256,
+                         threads_per_worker: int = 1):
+    """workers가 2 이상이면 ParallelEmbeddings, 아니면 현재 프로세스의 HuggingFaceEmbeddings"""
+    if workers > 1:
+        print(f"🚀 Starting {workers} embedding workers ({model_name}, "
+              f"{threads_per_worker} thread(s) each)...")
+        return ParallelEmbeddings(model_name, workers, batch_size, threads_per_worker)
+
+    print(f"🚀 Loading embedding model ({model_name})...")
+    embeddings = HuggingFaceEmbeddings(model_name=model_name, encode_kwargs=_encode_kwargs(batch_size))
+    print("   -> Model loaded.")
+    return embeddings
@@ -1,16 +1,30 @@
 # spotify/build_chroma_db_spotify.py
 
 import os
+import sys
+import json
+import hashlib
 import pandas as pd
 from langchain_community.vectorstores import Chroma
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
 from tqdm import tqdm
 
+# 임베딩 모델 로더는 rag/ 빌드 스크립트와 공유
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag"))
+from parallel_embeddings import ParallelEmbeddings, embedder_settings, load_embedding_model
+
 INPUT_CSV = "spotify/data/spotify_tracks.csv"
 DB_PERSIST_DIR = "spotify/chroma_db"
 COLLECTION_NAME = "spotify_songs"
 EMBED_MODEL_NAME = "all-MiniLM-L6-v2"
+MANIFEST_FILE = os.path.join(DB_PERSIST_DIR, "content_hashes.json")  # {"embedder": {...}, "hashes": {track_id: 내용 해시}}
+METADATA_COLUMNS = ["track_id", "track_name", "artist", "genre", "mood_tags"]
+
+# 멀티 프로세스 임베딩 (CPU 전용 빌드 서버용)
+EMBED_WORKERS = 0               # 0 또는 1이면 현재 프로세스에서 임베딩
+EMBED_BATCH_SIZE = 256
+EMBED_THREADS_PER_WORKER = 1
 
 def load_documents(csv_path):
     if not os.path.exists(csv_path):
@@ -18,6 +32,10 @@ def load_documents(csv_path):
         return []
     
     df = pd.read_csv(csv_path).fillna('')
+    # 수집 단계에서 빠진 컬럼(예: mood_tags)은 빈 문자열로 채움
+    for col in METADATA_COLUMNS:
+        if col not in df.columns:
+            df[col] = ''
     documents = []
 
     for _, row in tqdm(df.iterrows(), total=df.shape[0]):
@@ -34,6 +52,82 @@ def load_documents(csv_path):
     
     return documents
 
+def load_embeddings():
+    return load_embedding_model(EMBED_MODEL_NAME, EMBED_WORKERS, EMBED_BATCH_SIZE, EMBED_THREADS_PER_WORKER)
+
+def _content_hash(doc: Document) -> str:
+    payload = json.dumps([doc.page_content, doc.metadata], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _load_manifest():
+    """이전 해시 기록. 없거나 임베딩 모델/설정이 바뀌었으면 None (= 전체 다시 임베딩)"""
+    if not os.path.exists(MANIFEST_FILE):
+        return None
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    stored = data.get("embedder") if isinstance(data, dict) else None
+    if stored != embedder_settings(EMBED_MODEL_NAME) or "hashes" not in data:
+        print("ℹ️  Embedding model/settings changed since last build. Rebuilding all vectors.")
+        return None
+    return data["hashes"]
+
+def _save_manifest(manifest):
+    os.makedirs(DB_PERSIST_DIR, exist_ok=True)
+    tmp_path = MANIFEST_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"embedder": embedder_settings(EMBED_MODEL_NAME), "hashes": manifest}, f)
+    os.replace(tmp_path, MANIFEST_FILE)
+
+def build_chroma_db_incremental():
+    """
+    track_id별 내용 해시를 비교해 새 곡/바뀐 곡만 임베딩하여 upsert 하고,
+    CSV에서 사라진 곡은 삭제합니다. (처음 실행이면 전체를 임베딩)
+    """
+    docs = load_documents(INPUT_CSV)
+    if not docs:
+        return
+    # 같은 곡이 여러 장르 검색에 걸려 중복 수집될 수 있으므로 track_id 기준 첫 번째만 사용
+    unique = {}
+    for d in docs:
+        unique.setdefault(str(d.metadata["track_id"]), d)
+
+    embeddings = load_embeddings()
+    db = Chroma(collection_name=COLLECTION_NAME, embedding_function=embeddings, persist_directory=DB_PERSIST_DIR)
+
+    old_manifest = _load_manifest()
+    if old_manifest is None:
+        # 해시 기록이 없는 기존 DB(랜덤 ID)는 비우고 track_id를 ID로 다시 구축
+        # (남아 있는 해시 파일은 먼저 삭제: 중단되면 다음 실행도 전체 빌드)
+        if os.path.exists(MANIFEST_FILE):
+            os.remove(MANIFEST_FILE)
+        db.delete_collection()
+        db = Chroma(collection_name=COLLECTION_NAME, embedding_function=embeddings, persist_directory=DB_PERSIST_DIR)
+        old_manifest = {}
+
+    new_manifest = {track_id: _content_hash(d) for track_id, d in unique.items()}
+    changed = [track_id for track_id, h in new_manifest.items() if old_manifest.get(track_id) != h]
+    removed = [track_id for track_id in old_manifest if track_id not in new_manifest]
+
+    if changed:
+        texts = [unique[track_id].page_content for track_id in changed]
+        db._collection.upsert(
+            ids=changed,
+            embeddings=embeddings.embed_documents(texts),
+            metadatas=[unique[track_id].metadata for track_id in changed],
+            documents=texts
+        )
+    if removed:
+        db._collection.delete(ids=removed)
+
+    _save_manifest(new_manifest)
+    if isinstance(embeddings, ParallelEmbeddings):
+        embeddings.close()
+    print(f"✅ Spotify ChromaDB updated: {len(changed)} upserted, {len(removed)} deleted, "
+          f"{len(unique) - len(changed)} unchanged. ({DB_PERSIST_DIR})")
+
 def build_chroma_db():
     docs = load_documents(INPUT_CSV)
     embeddings = HuggingFaceEmbeddings(model_name=EMBED_MODEL_NAME)
@@ -42,4 +136,4 @@ def build_chroma_db():
     print(f"✅ Spotify ChromaDB built and saved to {DB_PERSIST_DIR}")
 
 if __name__ == "__main__":
-    build_chroma_db()
+    build_chroma_db_incremental()